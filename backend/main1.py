@@ -1,85 +1,124 @@
+import argparse
 import cv2
 import numpy as np
 import time
 from models.area_counter import AreaVehicleCounter
-import torch
-from ultralytics import YOLO
+from models.detections import clip_detections, empty_detections, results_to_array
+from models.motion_gate import MotionGate
+from models.roi_inference import RoiCropper
+from models.tracker import SortTracker
+from utils.visualization import OverlayRenderer
+from utils.capture import FrameSource
+from utils.runner import PipelineRunner
+from utils.preprocess import FramePreprocessor
+from utils.video_writer import AsyncVideoWriter
+from utils.profiling import StageProfiler
 
 class WebcamVideoProcessor:
-    def __init__(self, source=1, frame_width=800, frame_height=600):
+    def __init__(self, source=1, frame_width=800, frame_height=600, inference=None, camera_id=0,
+                 motion_gate=None, roi_cropper=None, tracker=None, detector=None, profiler=None):
         """
         Initialize with an external webcam (source=1) or video file (source='path/to/video.mp4').
+        A RoiCropper as `roi_cropper` restricts detection to the lane ROIs, and detections
+        get persistent track ids from `tracker` (a SortTracker by default).
         """
         self.frame_width = frame_width
         self.frame_height = frame_height
-        self.cap = cv2.VideoCapture(source)  # Use 1 for external webcam, or path to video file
-        self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, frame_width)
-        self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, frame_height)
-        if not self.cap.isOpened():
+        # Read on a background thread; live cameras drop stale frames, files keep every frame
+        is_file = isinstance(source, str)
+        try:
+            self.source = FrameSource(source, queue_size=2, width=frame_width, height=frame_height,
+                                      drop_oldest=not is_file).start()
+        except RuntimeError:
             raise RuntimeError(f"Could not open {'external webcam' if source == 1 else 'video file'}")
 
-        # Load YOLOv8n model for vehicle detection
-        self.model = YOLO('yolov8n.pt')  # Pre-trained YOLOv8 Nano model
-        self.class_names = self.model.names
+        self.inference = inference
+        self.camera_id = camera_id
+        if inference is not None:
+            inference.register(camera_id)
+        self.motion_gate = motion_gate
+        self.roi_cropper = roi_cropper
+        self.tracker = tracker if tracker is not None else SortTracker()
+        self.profiler = profiler if profiler is not None else StageProfiler(enabled=False)
+        self.last_detections = empty_detections()
+        # Resize and brightness/contrast into reused buffers (no per-frame allocations)
+        self.preprocessor = FramePreprocessor(size=(frame_width, frame_height), alpha=1.2, beta=10)
+        self.detector = detector
+        self.model = None
+        if detector is not None:
+            self.class_names = detector.names
+        elif inference is None:
+            from ultralytics import YOLO  # Imported here so the ONNX path never loads torch
+            # Load YOLOv8n model for vehicle detection
+            self.model = YOLO('yolov8n.pt')  # Pre-trained YOLOv8 Nano model
+            self.class_names = self.model.names
+        else:
+            self.class_names = inference.names
         # Expand vehicle classes to include more types (e.g., bicycles, trucks, etc.)
         self.vehicle_classes = [0, 1, 2, 3, 5, 7]  # person, bicycle, car, motorcycle, bus, truck
 
-    def detect_vehicles(self, frame):
+    def detect_vehicles(self, frame, preprocess_s=0.0):
         """
-        Detect vehicles using YOLOv8n with improved settings and return detections in [x1, y1, x2, y2, track_id] format.
+        Detect vehicles using YOLOv8n with improved settings and return an (N, 7)
+        [x1, y1, x2, y2, track_id, conf, cls] array (see models.detections).
+        `preprocess_s` is time already spent preparing this frame (the resize in
+        generate_frame), so the frame gets a single 'preprocess' sample.
         """
+        profiler = self.profiler
+        predict_kwargs = {}
+        start = time.monotonic()
+        if self.roi_cropper is not None:
+            # Only the road region goes to the model, at the smallest adequate input size
+            frame = self.roi_cropper.crop(frame)
+            predict_kwargs['imgsz'] = self.roi_cropper.imgsz
+
         # Preprocess frame for better detection (adjust brightness/contrast if needed)
-        frame = cv2.convertScaleAbs(frame, alpha=1.2, beta=10)  # Increase brightness and contrast slightly
+        frame = self.preprocessor.enhance(frame)  # Increase brightness and contrast slightly (LUT)
+        profiler.record('preprocess', preprocess_s + time.monotonic() - start)
 
         # Perform inference with lower confidence threshold and higher image quality
-        results = self.model(frame, conf=0.3, iou=0.7)  # Lower confidence (0.3), higher IoU (0.7) for small objects
-        detections = []
-        track_id_counter = 0  # Simple tracking (can be enhanced with DeepSORT for persistent IDs)
-
-        for result in results:
-            boxes = result.boxes
-            for box in boxes:
-                x1, y1, x2, y2 = map(int, box.xyxy[0].tolist())
-                conf = box.conf[0].item()
-                cls = int(box.cls[0].item())
-
-                # Check if the detected object is a vehicle or related object
-                if cls in self.vehicle_classes and conf > 0.3:
-                    # Ensure detections fit within frame to avoid out-of-bounds errors
-                    x1 = max(0, min(x1, self.frame_width - 1))
-                    y1 = max(0, min(y1, self.frame_height - 1))
-                    x2 = max(0, min(x2, self.frame_width - 1))
-                    y2 = max(0, min(y2, self.frame_height - 1))
-                    
-                    # Use a simple frame-based tracking (incremental track_id for this frame)
-                    track_id = track_id_counter
-                    track_id_counter += 1
-                    detections.append([x1, y1, x2, y2, track_id])
-
-                    # Optional: Draw bounding boxes for debugging (remove in final version)
-                    cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
-                    cv2.putText(frame, f"{self.class_names[cls]} {conf:.2f}", (x1, y1-10),
-                               cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
-
-        return np.array(detections) if detections else np.array([])
+        with profiler.span('inference'):
+            if self.detector is not None:
+                # Already filtered (conf > 0.3, vehicle classes) in the shared (N, 7) format
+                detections = self.detector.detect(frame)
+            elif self.inference is not None:
+                results = [self.inference.predict(self.camera_id, frame, conf=0.3, iou=0.7, **predict_kwargs)]
+            else:
+                results = self.model(frame, conf=0.3, iou=0.7, **predict_kwargs)  # Lower confidence (0.3), higher IoU (0.7) for small objects
+        with profiler.span('postprocess'):
+            if self.detector is None:
+                # Vectorized class/confidence filtering and clipping into the shared (N, 7) format
+                detections = results_to_array(results, classes=self.vehicle_classes, min_conf=0.3)
+            if self.roi_cropper is not None:
+                self.roi_cropper.to_frame(detections)
+            clip_detections(detections, (self.frame_height, self.frame_width))
+        with profiler.span('tracking'):
+            # Replace the per-frame row index with persistent track ids
+            return self.tracker.update(detections)
 
     def generate_frame(self):
         """
         Capture and process a frame from the external webcam, returning the frame and vehicle detections.
         """
-        ret, frame = self.cap.read()
-        if not ret:
+        with self.profiler.span('capture'):
+            frame, _ = self.source.read(timeout=5.0)
+        if frame is None:
             raise RuntimeError("Failed to capture frame from external webcam")
         
-        # Resize frame to match desired dimensions (800x600)
-        frame = cv2.resize(frame, (self.frame_width, self.frame_height))
-        
-        detections = self.detect_vehicles(frame)
-        return frame, detections
+        start = time.monotonic()
+        # Resize frame to match desired dimensions (800x600), into a reused buffer
+        frame = self.preprocessor.resize(frame)
+        resize_s = time.monotonic() - start
+
+        if self.motion_gate is None or self.motion_gate.should_infer(frame):
+            self.last_detections = self.detect_vehicles(frame, preprocess_s=resize_s)
+        else:
+            self.profiler.record('preprocess', resize_s)
+        return frame, self.last_detections
 
     def release(self):
-        """Release the video capture resource."""
-        self.cap.release()
+        """Stop the capture thread and release the video capture resource."""
+        self.source.stop()
 
 def draw_traffic_lights(frame, phase):
     """
@@ -92,94 +131,117 @@ def draw_traffic_lights(frame, phase):
 
 
 
-def main(source=1):
+def main(source=1, render_every=1, roi_crop=False, headless=False, backend='torch', record=None,
+         segment_seconds=None, profile=None):
     """
     Main function to process external webcam input, detect vehicles, calculate density, and display results.
     Use source=1 for external webcam, or provide a video file path (e.g., 'path/to/video.mp4').
+    render_every=N draws every Nth frame; render_every=0 disables drawing.
+    roi_crop=True runs detection only on the lane ROI region of the frame; only the PyTorch
+    backend also shrinks its input size to the crop (ONNX exports have a fixed input size).
+    headless=True makes no GUI calls (for servers without a display).
+    backend='onnx' runs the model on ONNX Runtime, 'onnx-int8' on its INT8-quantized export.
+    record='path.mp4' saves rendered frames in the background, rotated every segment_seconds if given.
+    profile='path.json' records per-stage latencies and dumps them there at exit (and on SIGUSR1).
     """
     print(f"Initializing traffic monitoring with external webcam...")
-    processor = WebcamVideoProcessor(source=source)
+    detector = None
+    if backend != 'torch':
+        from models.onnx_detector import OnnxDetector
+        detector = OnnxDetector('yolov8n.pt', conf=0.3, iou=0.7, classes=[0, 1, 2, 3, 5, 7],
+                                quantize=backend == 'onnx-int8')
+    profiler = StageProfiler(enabled=bool(profile))
+    if profile:
+        profiler.dump_on_signal(profile)
+    processor = WebcamVideoProcessor(source=source, motion_gate=MotionGate(), detector=detector,
+                                     profiler=profiler)
     area_counter = AreaVehicleCounter()
+    writer = None
+    if record:
+        writer = AsyncVideoWriter(record, fps=processor.source.fps, segment_seconds=segment_seconds)
+    # Larger font and spacing for readability on the webcam feed; headless only draws for a recording
+    renderer = OverlayRenderer(area_counter, render_every=0 if headless and writer is None else render_every,
+                               box_alpha=0.8, font_scale=1.0, line_spacing=40)
     phase = 0  # Simulated phase (0-3) for visualization; in RL, this would come from TrafficSignalEnv
 
     # Set default ROIs for the 800x600 frame (adjust based on your road layout)
     frame_shape = (600, 800)  # Height, Width
     area_counter.update(np.array([]), frame_shape)  # Initialize ROIs
-
-    episode_duration = 300  # 5 minutes
-    frame_delay = 50  # ms (adjust for real-time performance)
-    frame_count = 0
-
-    cv2.namedWindow(f'Traffic Monitoring from External Webcam', cv2.WINDOW_NORMAL)
-    
-    try:
-        start_time = time.time()
-        
-        while (time.time() - start_time) < episode_duration:
+    if roi_crop:
+        processor.roi_cropper = RoiCropper.from_counter(area_counter, frame_shape)
+        if detector is not None:
+            print(f"Warning: --roi-crop with the {backend} backend still runs the model at its "
+                  f"{detector.imgsz}px export size; only the PyTorch backend uses the smaller crop size")
+
+    # Live cameras are paced to their frame rate; files run as fast as possible
+    is_file = isinstance(source, str)
+    runner = PipelineRunner('Traffic Monitoring from External Webcam', headless=headless,
+                            pace_fps=None if is_file else processor.source.fps,
+                            max_seconds=300)  # 5 minutes
+    start_time = time.time()
+
+    def step():
+        nonlocal phase, start_time
+        try:
             frame, detections = processor.generate_frame()
+        except RuntimeError:
+            if processor.source.ended:
+                raise StopIteration
+            raise
+        with profiler.span('counting'):
             counts, densities = area_counter.update(detections, frame.shape)
-            
+
+        with profiler.span('control'):
             # Simulate phase change (for visualization; RL would handle this)
             phase_time = time.time() - start_time
             if phase_time > 30:  # Change phase every 30 seconds (simplified logic)
                 phase = (phase + 1) % 4
                 start_time = time.time()
 
-            frame = area_counter.draw_visualization(frame)
+        if not renderer.should_render():
+            return None
+        with profiler.span('render'):
+            renderer.draw_static(frame)
             draw_traffic_lights(frame, phase)
-            
-            # Display improved metrics (phase, vehicles, and lane-wise densities)
+
+            # Display metrics (phase, vehicles, and lane-wise densities)
             metrics = [
                 f"Phase {phase}: {phase_time:.1f}s",
                 f"Vehicles: {len(detections)}"
             ]
-            
-            # Enhanced text display with better background and formatting
-            text_color = (255, 255, 255)  # White text
-            bg_color = (0, 0, 0, 150)     # Darker black background with higher opacity
-            font = cv2.FONT_HERSHEY_SIMPLEX
-            font_scale = 1.0              # Larger font for better readability
-            thickness = 2
-            
-            # Calculate text sizes for background box
-            max_width = 0
-            total_height = 0
-            for text in metrics:
-                (text_w, text_h), _ = cv2.getTextSize(text, font, font_scale, thickness)
-                max_width = max(max_width, text_w)
-                total_height += text_h + 15  # Increased spacing for readability
-            
-            x, y = 10, 10
-            box_w, box_h = max_width + 30, total_height + 20  # Larger padding for better contrast
-            
-            # Draw semi-transparent background box
-            overlay = frame.copy()
-            cv2.rectangle(overlay, (x, y), (x + box_w, y + box_h), (0, 0, 0), -1)
-            cv2.addWeighted(overlay, 0.8, frame, 0.2, 0, frame)  # Higher opacity for better contrast
-            
-            # Draw metrics with improved positioning
-            y_pos = 30
-            for text in metrics + [f"North: {densities['north']:.1f}%", 
-                                 f"South: {densities['south']:.1f}%", 
-                                 f"East: {densities['east']:.1f}%", 
-                                 f"West: {densities['west']:.1f}%"]:
-                cv2.putText(frame, text, (x + 15, y_pos), font, font_scale, text_color, thickness)
-                y_pos += 40  # Larger spacing for lane densities
-
-            cv2.imshow(f'Traffic Monitoring from External Webcam', frame)
-            frame_count += 1
-
-            if cv2.waitKey(frame_delay) & 0xFF == ord('q'):
-                break
+            renderer.draw_metrics(frame, metrics + renderer.lane_lines())
+            if writer is not None:
+                writer.write(frame)
+        return frame
 
+    try:
+        runner.run(step)
     except Exception as e:
         print(f"Error occurred: {str(e)}")
         raise
     finally:
+        stats = processor.source.stats()
         processor.release()
-        cv2.destroyAllWindows()
-        print(f"Monitoring completed\nTotal frames rendered: {frame_count}")
+        print(f"Monitoring completed\n{runner.report()}")
+        print(f"Capture: {stats['frames_read']} read, {stats['frames_dropped']} dropped, "
+              f"avg latency {stats['avg_capture_latency_ms']:.1f}ms")
+        print(f"Motion gate skipped {processor.motion_gate.skip_ratio:.0%} of inferences")
+        if writer is not None:
+            print(writer.close_and_report())
+        if profile:
+            print(profiler.finish(profile))
 
 if __name__ == "__main__":
-    # Use source=1 for external webcam, or provide a video file path (e.g., 'path/to/video.mp4')
-    main(source=1)  # Default to external webcam; change to video path for stock video
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Traffic monitoring from a webcam or video file")
+    parser.add_argument('--source', default='1', help="camera index or video file path (default: external webcam 1)")
+    parser.add_argument('--headless', action='store_true', help="run without any GUI calls")
+    parser.add_argument('--roi-crop', action='store_true', help="detect only inside the lane ROIs (smaller model input with the torch backend only)")
+    parser.add_argument('--backend', choices=['torch', 'onnx', 'onnx-int8'], default='torch',
+                        help="inference backend (onnx backends run on CPU via ONNX Runtime)")
+    parser.add_argument('--record', help="save the annotated stream to this video path")
+    parser.add_argument('--segment-seconds', type=float, help="rotate the recording into segments of this length")
+    parser.add_argument('--profile', help="write per-stage latency histograms to this JSON file")
+    args = parser.parse_args()
+    main(source=int(args.source) if args.source.isdigit() else args.source,
+         roi_crop=args.roi_crop, headless=args.headless, backend=args.backend,
+         record=args.record, segment_seconds=args.segment_seconds, profile=args.profile)
@@ -1,15 +1,36 @@
+import argparse
+import os
 import cv2
 import numpy as np
-from collections import defaultdict, deque
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from scipy.optimize import linear_sum_assignment
 from ultralytics import YOLO
+from models.area_counter import box_centers
+from models.detections import results_to_array, X1, Y2, CLS
+from utils.runner import PipelineRunner
+from utils.video_chunks import keyframe_indices, plan_chunks, stitch_tracks
+from utils.video_writer import AsyncVideoWriter
+from utils.profiling import StageProfiler
 
 class VehicleCounter:
-    def __init__(self, model_path='yolov8n.pt'):
-        """Initialize the VehicleCounter with YOLO model and configurations."""
-        try:
-            self.model = YOLO(model_path)
-        except Exception as e:
-            raise RuntimeError(f"Failed to load YOLO model: {e}")
+    def __init__(self, model_path='yolov8n.pt', inference=None, camera_id=0, profiler=None):
+        """
+        Initialize the VehicleCounter with YOLO model and configurations.
+        model_path=None loads no model: the counter can then only replay() known tracks.
+        """
+        self.inference = inference
+        self.camera_id = camera_id
+        if inference is not None:
+            inference.register(camera_id)
+        self.profiler = profiler if profiler is not None else StageProfiler(enabled=False)
+        if inference is None and model_path is not None:
+            try:
+                self.model = YOLO(model_path)
+            except Exception as e:
+                raise RuntimeError(f"Failed to load YOLO model: {e}")
+        else:
+            self.model = None
             
         self.vehicle_classes = {
             2: 'car',
@@ -17,151 +38,350 @@ class VehicleCounter:
             5: 'bus',
             7: 'truck'
         }
-        self.tracks = {}
+        # Track state as struct-of-arrays; centroid_history[:, 0] is the newest center
+        self.history_size = 10
+        self.track_ids = np.empty(0, dtype=np.int64)
+        self.class_ids = np.empty(0, dtype=np.int64)
+        self.bboxes = np.empty((0, 4), dtype=np.int64)
+        self.centroid_history = np.empty((0, self.history_size, 2), dtype=np.int64)
+        self.history_len = np.empty(0, dtype=np.int64)
         self.next_id = 0
         self.direction_counts = defaultdict(lambda: defaultdict(int))
+        self.last_events = []  # (track_id, direction, class_name) counted on the last frame
         self.min_displacement = 50  # Minimum movement to count direction
         self.max_distance = 100     # Max pixel distance for ID matching
         self.font = cv2.FONT_HERSHEY_SIMPLEX
 
-    def _calculate_direction(self, old_center, new_center):
-        """Calculate movement direction based on center points."""
-        dx = new_center[0] - old_center[0]
-        dy = new_center[1] - old_center[1]
-        
-        if abs(dx) + abs(dy) < self.min_displacement:
-            return None
-        
-        angle = np.degrees(np.arctan2(dy, dx))
-        
-        if -45 <= angle < 45:
-            return 'east'
-        elif 45 <= angle < 135:
-            return 'south'
-        elif -135 <= angle < -45:
-            return 'north'
-        return 'west'
-
-    def _match_tracks(self, current_detections):
-        """Match existing tracks with new detections and update tracking data."""
-        updated_tracks = {}
-        used_detections = set()
-
-        # Match existing tracks
-        for track_id, track_data in self.tracks.items():
-            last_center = track_data['centroid_history'][-1]
-            best_match_idx = None
-            min_dist = self.max_distance
-
-            for i, (center, cls_id, bbox) in enumerate(current_detections):
-                if i in used_detections:
-                    continue
-                dist = np.linalg.norm(np.array(center) - np.array(last_center))
-                if dist < min_dist:
-                    min_dist = dist
-                    best_match_idx = i
-
-            if best_match_idx is not None:
-                center, cls_id, bbox = current_detections[best_match_idx]
-                used_detections.add(best_match_idx)
-                track_data['centroid_history'].appendleft(center)
-                track_data['class_id'] = cls_id
-                track_data['bbox'] = bbox
-                updated_tracks[track_id] = track_data
-
-        # Add new detections as new tracks
-        for i, (center, cls_id, bbox) in enumerate(current_detections):
-            if i not in used_detections:
-                updated_tracks[self.next_id] = {
-                    'centroid_history': deque([center], maxlen=10),
-                    'class_id': cls_id,
-                    'bbox': bbox
-                }
-                self.next_id += 1
-
-        self.tracks = updated_tracks
-
-    def process_frame(self, frame):
-        """Process a single frame and return annotated frame."""
+    def reset(self):
+        """Forget all tracks and counts (the model stays loaded)."""
+        self.track_ids = np.empty(0, dtype=np.int64)
+        self.class_ids = np.empty(0, dtype=np.int64)
+        self.bboxes = np.empty((0, 4), dtype=np.int64)
+        self.centroid_history = np.empty((0, self.history_size, 2), dtype=np.int64)
+        self.history_len = np.empty(0, dtype=np.int64)
+        self.next_id = 0
+        self.direction_counts.clear()
+        self.last_events = []
+
+    def _calculate_directions(self, old_centers, new_centers):
+        """Movement direction per row ('' where the displacement is too small)."""
+        delta = new_centers - old_centers
+        angle = np.degrees(np.arctan2(delta[:, 1], delta[:, 0]))
+        directions = np.select([(-45 <= angle) & (angle < 45), (45 <= angle) & (angle < 135),
+                                (-135 <= angle) & (angle < -45)], ['east', 'south', 'north'], 'west')
+        directions[np.abs(delta).sum(axis=1) < self.min_displacement] = ''
+        return directions
+
+    def _match_tracks(self, centers, class_ids, bboxes):
+        """
+        Match existing tracks with new detections and update tracking data.
+
+        Distances from every track's latest center to every detection center are
+        one broadcast; pairs at or beyond max_distance are gated out and the rest
+        are assigned optimally (minimum total distance). Unmatched tracks are
+        dropped and unmatched detections start new tracks.
+        """
+        n_tracks, n_dets = len(self.track_ids), len(centers)
+        det_track = np.full(n_dets, -1, dtype=np.int64)
+        if n_tracks and n_dets:
+            diff = centers[None, :, :] - self.centroid_history[:, None, 0, :]
+            dist = np.sqrt((diff.astype(np.float64) ** 2).sum(axis=2))
+            gated = dist < self.max_distance
+            cost = np.where(gated, dist, self.max_distance * 1e3)
+            rows, cols = linear_sum_assignment(cost)
+            ok = gated[rows, cols]
+            det_track[cols[ok]] = rows[ok]
+
+        # Matched tracks first (in detection order), then new ones
+        order = np.concatenate([np.flatnonzero(det_track >= 0), np.flatnonzero(det_track < 0)])
+        prev = det_track[order]
+        n_new = int((prev < 0).sum())
+        track_ids = np.concatenate([self.track_ids[prev[prev >= 0]], np.arange(self.next_id, self.next_id + n_new)])
+        self.next_id += n_new
+        self._advance(prev, track_ids, centers[order], class_ids[order], bboxes[order])
+
+    def _advance(self, prev, track_ids, centers, class_ids, bboxes):
+        """
+        Replace the tracks with one row per detection. `prev` is each row's track
+        row on the previous frame (-1 starts a new track); tracks not continued
+        are dropped.
+        """
+        continuing = prev >= 0
+        history = np.zeros((len(prev), self.history_size, 2), dtype=np.int64)
+        history[continuing, 1:] = self.centroid_history[prev[continuing], :-1]
+        history[:, 0] = centers
+        history_len = np.ones(len(prev), dtype=np.int64)
+        history_len[continuing] = np.minimum(self.history_len[prev[continuing]] + 1, self.history_size)
+        self.track_ids, self.class_ids, self.bboxes = track_ids, class_ids, bboxes
+        self.centroid_history, self.history_len = history, history_len
+
+    def _count(self):
+        """Update direction counts for stable tracks (oldest vs newest center)."""
+        self.last_events = []
+        stable = np.flatnonzero(self.history_len >= 5)
+        if len(stable):
+            oldest = self.centroid_history[stable, self.history_len[stable] - 1]
+            directions = self._calculate_directions(oldest, self.centroid_history[stable, 0])
+            for idx, direction in zip(stable.tolist(), directions.tolist()):
+                if direction:
+                    class_name = self.vehicle_classes[int(self.class_ids[idx])]
+                    self.direction_counts[direction][class_name] += 1
+                    self.last_events.append((int(self.track_ids[idx]), direction, class_name))
+                    self.history_len[idx] = 1  # Restart from the newest center
+
+    def replay(self, track_ids, class_ids, boxes):
+        """
+        Advance and count one frame of tracks whose ids are already known (e.g.
+        stitched across chunks by process_video_parallel), as process_frame would.
+        """
+        track_ids = np.asarray(track_ids, dtype=np.int64)
+        boxes = np.asarray(boxes, dtype=np.int64).reshape(-1, 4)
+        prev = np.full(len(track_ids), -1, dtype=np.int64)
+        if len(self.track_ids) and len(track_ids):
+            order = np.argsort(self.track_ids)
+            pos = np.minimum(np.searchsorted(self.track_ids[order], track_ids), len(order) - 1)
+            found = self.track_ids[order[pos]] == track_ids
+            prev[found] = order[pos[found]]
+        self._advance(prev, track_ids, box_centers(boxes), np.asarray(class_ids, dtype=np.int64), boxes)
+        self._count()
+
+    def process_frame(self, frame, annotate=True):
+        """Process a single frame and return annotated frame (annotate=False skips drawing)."""
         if frame is None or frame.size == 0:
             return frame
 
+        profiler = self.profiler
         # Detect objects
-        results = self.model(frame, verbose=False)
-        current_detections = []
-        
-        # Extract vehicle detections
-        for box in results[0].boxes:
-            cls_id = int(box.cls[0])
-            if cls_id in self.vehicle_classes:
-                x1, y1, x2, y2 = map(int, box.xyxy[0])
-                center = ((x1 + x2) // 2, (y1 + y2) // 2)
-                current_detections.append((center, cls_id, (x1, y1, x2, y2)))
-
-        # Update tracking
-        self._match_tracks(current_detections)
-
-        # Draw annotations and update counts
-        for track_id, track_data in self.tracks.items():
-            x1, y1, x2, y2 = track_data['bbox']
-            class_name = self.vehicle_classes[track_data['class_id']]
-            
-            # Draw bbox and label
-            cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
-            label = f"{class_name} {track_id}"
-            cv2.putText(frame, label, (x1, y1 - 10), self.font, 0.5, (0, 255, 0), 2)
-
-            # Update direction counts for stable tracks
-            if len(track_data['centroid_history']) >= 5:
-                old_center = track_data['centroid_history'][-1]
-                new_center = track_data['centroid_history'][0]
-                direction = self._calculate_direction(old_center, new_center)
-                
-                if direction:
-                    self.direction_counts[direction][class_name] += 1
-                    track_data['centroid_history'] = deque([new_center], maxlen=10)
+        with profiler.span('inference'):
+            if self.inference is not None:
+                results = [self.inference.predict(self.camera_id, frame, verbose=False)]
+            else:
+                results = self.model(frame, verbose=False)
+        with profiler.span('postprocess'):
+            # Extract vehicle detections
+            dets = results_to_array(results[0], classes=self.vehicle_classes)
+            boxes = dets[:, X1:Y2 + 1].astype(np.int64)
+            centers = np.stack([(boxes[:, 0] + boxes[:, 2]) // 2, (boxes[:, 1] + boxes[:, 3]) // 2], axis=1)
+
+        with profiler.span('tracking'):
+            # Update tracking
+            self._match_tracks(centers, dets[:, CLS].astype(np.int64), boxes)
+
+        with profiler.span('counting'):
+            self._count()
+
+        if not annotate:
+            return frame
+
+        with profiler.span('render'):
+            # Draw annotations
+            for track_id, cls_id, (x1, y1, x2, y2) in zip(self.track_ids.tolist(), self.class_ids.tolist(),
+                                                          self.bboxes.tolist()):
+                class_name = self.vehicle_classes[cls_id]
+
+                # Draw bbox and label
+                cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
+                label = f"{class_name} {track_id}"
+                cv2.putText(frame, label, (x1, y1 - 10), self.font, 0.5, (0, 255, 0), 2)
+
+            # Display counts on frame
+            y_pos = 30
+            for direction, types in self.direction_counts.items():
+                text = f"{direction}: " + ", ".join(f"{k}:{v}" for k, v in types.items())
+                cv2.putText(frame, text, (10, y_pos), self.font, 0.7, (0, 255, 0), 2)
+                y_pos += 30
 
         return frame
 
     def get_counts(self):
-        """Return current direction counts."""
-        return dict(self.direction_counts)
+        """Return current direction counts as {direction: {class_name: count}}."""
+        return {direction: dict(types) for direction, types in self.direction_counts.items()}
 
-def process_video(video_path):
-    """Process video file and display results."""
+def process_video(video_path, headless=False, record=None, segment_seconds=None,
+                  profile=None):
+    """
+    Process video file and display results (headless=True skips all GUI calls).
+    Annotated frames are recorded to `record` in the background (off by default),
+    rotated every `segment_seconds` if given. profile='path.json' records
+    per-stage latencies and dumps them there at exit (and on SIGUSR1).
+    """
+    writer = None
+    profiler = StageProfiler(enabled=bool(profile))
+    if profile:
+        profiler.dump_on_signal(profile)
     try:
         cap = cv2.VideoCapture(video_path)
         if not cap.isOpened():
             raise ValueError(f"Could not open video file: {video_path}")
 
-        counter = VehicleCounter()
-        
-        while True:
-            ret, frame = cap.read()
+        counter = VehicleCounter(profiler=profiler)
+        if record:
+            writer = AsyncVideoWriter(record, fps=cap.get(cv2.CAP_PROP_FPS), segment_seconds=segment_seconds)
+        annotate = not headless or writer is not None
+        # Files are processed as fast as possible, no pacing
+        runner = PipelineRunner('Vehicle Counter', headless=headless)
+
+        def step():
+            with profiler.span('capture'):
+                ret, frame = cap.read()
             if not ret:
-                break
+                raise StopIteration
                 
-            annotated_frame = counter.process_frame(frame)
-            counts = counter.get_counts()
-            
-            # Display counts on frame
-            y_pos = 30
-            for direction, types in counts.items():
-                text = f"{direction}: " + ", ".join(f"{k}:{v}" for k, v in types.items())
-                cv2.putText(annotated_frame, text, (10, y_pos), 
-                           cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
-                y_pos += 30
-            
-            cv2.imshow('Vehicle Counter', annotated_frame)
-            if cv2.waitKey(1) & 0xFF == ord('q'):
-                break
+            annotated_frame = counter.process_frame(frame, annotate=annotate)
+            if not annotate:
+                return None
+            if writer is not None:
+                writer.write(annotated_frame)
+            return None if headless else annotated_frame
+
+        runner.run(step)
+        print(runner.report())
                 
     except Exception as e:
         print(f"Error processing video: {e}")
     finally:
         cap.release()
-        cv2.destroyAllWindows()
+        if writer is not None:
+            print(writer.close_and_report())
+        if profile:
+            print(profiler.finish(profile))
+
+_worker_counter = None
+
+def _init_worker(model_path):
+    """Load one model per worker process; each worker stays single-threaded so cores aren't oversubscribed."""
+    global _worker_counter
+    import torch
+    torch.set_num_threads(1)
+    cv2.setNumThreads(1)
+    _worker_counter = VehicleCounter(model_path)
+
+def _analyze_chunk(video_path, warm_start, start, end, tail_start):
+    """
+    Decode frames [warm_start, end) of one chunk. Returns the tracks of the
+    frames it owns ([start, end)) as a list of per-frame (track_ids, class_ids,
+    boxes), plus per-frame (track_ids, boxes) of its warm-up frames (head) and
+    of the frames the next chunk also decodes (tail), for stitching.
+    """
+    counter = _worker_counter
+    counter.reset()
+    frames, head, tail = [], {}, {}
+    cap = cv2.VideoCapture(video_path)
+    try:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, warm_start)
+        for index in range(warm_start, end):
+            ret, frame = cap.read()
+            if not ret:
+                break
+            counter.process_frame(frame, annotate=False)
+            tracks = (counter.track_ids.copy(), counter.bboxes.copy())
+            if index < start:
+                head[index] = tracks
+            else:
+                frames.append((tracks[0], counter.class_ids.copy(), tracks[1]))
+            if index >= tail_start:
+                tail[index] = tracks
+    finally:
+        cap.release()
+    return frames, head, tail
+
+def _frame_count(video_path):
+    """Frame count from the container, or by grabbing every frame when it doesn't say."""
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise ValueError(f"Could not open video file: {video_path}")
+    try:
+        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+        if total_frames <= 0:
+            total_frames = 0
+            while cap.grab():
+                total_frames += 1
+    finally:
+        cap.release()
+    if not total_frames:
+        raise ValueError(f"No frames in video file: {video_path}")
+    return total_frames, fps
+
+def process_video_parallel(video_path, workers=None, model_path='yolov8n.pt', overlap=30,
+                           chunks_per_worker=2):
+    """
+    Offline direction counts for a whole video file, using all cores.
+
+    The video is split into keyframe-aligned chunks (see utils.video_chunks)
+    that are tracked in a process pool with one model per worker. Each chunk
+    also decodes `overlap` frames before its start to warm up its tracks;
+    tracks are stitched across chunks by box overlap on those shared frames,
+    so a vehicle keeps one id. Counting then replays the stitched tracks in
+    frame order, so every track keeps the count phase it has in a sequential
+    run and the result matches process_video's counts.
+    Returns {direction: {class_name: count}}, like VehicleCounter.get_counts.
+    """
+    total_frames, fps = _frame_count(video_path)
+    workers = workers or os.cpu_count() or 1
+    chunks = plan_chunks(total_frames, workers * chunks_per_worker, keyframe_indices(video_path, fps), overlap)
+    tail_starts = [warm_start for warm_start, _, _ in chunks[1:]] + [total_frames]
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(model_path,)) as pool:
+        futures = [pool.submit(_analyze_chunk, video_path, warm_start, start, end, tail_start)
+                   for (warm_start, start, end), tail_start in zip(chunks, tail_starts)]
+        results = [future.result() for future in futures]
+
+    counter = VehicleCounter(model_path=None)  # Counting only
+    global_ids = {}   # (chunk, local track id) -> global track id
+    stitched = 0
+    for chunk, (frames, head, _) in enumerate(results):
+        if chunk:
+            links = stitch_tracks(results[chunk - 1][2], head)
+            stitched += len(links)
+            for head_id, tail_id in links.items():
+                global_ids[(chunk, head_id)] = global_ids.setdefault((chunk - 1, tail_id), len(global_ids))
+        for track_ids, class_ids, boxes in frames:
+            gids = [global_ids.setdefault((chunk, track_id), len(global_ids)) for track_id in track_ids.tolist()]
+            counter.replay(gids, class_ids, boxes)
+
+    print(f"Analyzed {total_frames} frames in {len(chunks)} chunks on {workers} workers, "
+          f"{stitched} tracks stitched across chunk boundaries")
+    return counter.get_counts()
+
+def count_video(video_path, model_path='yolov8n.pt'):
+    """Sequential direction counts for a whole video file, without drawing (the reference for --check)."""
+    counter = VehicleCounter(model_path)
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise ValueError(f"Could not open video file: {video_path}")
+    try:
+        while True:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            counter.process_frame(frame, annotate=False)
+    finally:
+        cap.release()
+    return counter.get_counts()
 
 if __name__ == "__main__":
-    video_path = 'C:/Users/Piyush/Desktop/Personal Work/DEKHO/backend/data/test2.mp4'
-    process_video(video_path)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Count vehicles by direction in a video file")
+    parser.add_argument('video_path', nargs='?',
+                        default='C:/Users/Piyush/Desktop/Personal Work/DEKHO/backend/data/test2.mp4')
+    parser.add_argument('--headless', action='store_true', help="run without any GUI calls")
+    parser.add_argument('--workers', type=int, default=0,
+                        help="offline mode: analyze the file in parallel chunks on N processes")
+    parser.add_argument('--record', nargs='?', const='processed_output.mp4',
+                        help="save the annotated video (default path: processed_output.mp4)")
+    parser.add_argument('--segment-seconds', type=float, help="rotate the recording into segments of this length")
+    parser.add_argument('--profile', help="write per-stage latency histograms to this JSON file")
+    parser.add_argument('--check', action='store_true',
+                        help="with --workers: also count sequentially and fail if the results differ")
+    args = parser.parse_args()
+    if args.workers:
+        counts = process_video_parallel(args.video_path, workers=args.workers)
+        for direction, types in counts.items():
+            print(f"{direction}: " + ", ".join(f"{k}:{v}" for k, v in types.items()))
+        if args.check:
+            expected = count_video(args.video_path)
+            if counts != expected:
+                raise SystemExit(f"Parallel counts differ from the sequential run: {expected}")
+            print("Parallel counts match the sequential run")
+    else:
+        process_video(args.video_path, headless=args.headless, record=args.record,
+                      segment_seconds=args.segment_seconds, profile=args.profile)
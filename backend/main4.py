@@ -1,27 +1,43 @@
+import argparse
 import cv2
-import numpy as np
-from ultralytics import YOLO
-import time
 import logging
+from models.detections import empty_detections, results_to_array, X1, Y2, CONF
+from models.motion_gate import MotionGate
+from utils.runner import PipelineRunner
+from utils.profiling import StageProfiler
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
 class CarIntersectionCounter:
-    def __init__(self, model_path='yolov8x.pt'):
+    def __init__(self, model_path='yolov8x.pt', inference=None, camera_id=0, motion_gate=None,
+                 detector=None, profiler=None):
         """Initialize the CarIntersectionCounter with YOLO model."""
-        try:
-            self.model = YOLO(model_path)  # Load YOLOv8 model
-            logger.info("YOLOv8 model loaded successfully.")
-        except Exception as e:
-            logger.error(f"Failed to load YOLO model: {e}")
-            raise RuntimeError(f"Failed to load YOLO model: {e}")
+        self.inference = inference
+        self.camera_id = camera_id
+        if inference is not None:
+            inference.register(camera_id)
+        self.motion_gate = motion_gate
+        self.detector = detector
+        self.profiler = profiler if profiler is not None else StageProfiler(enabled=False)
+        self.last_cars = empty_detections()
+        self.model = None
+        if detector is None and inference is None:
+            from ultralytics import YOLO
+            try:
+                self.model = YOLO(model_path)  # Load YOLOv8 model
+                logger.info("YOLOv8 model loaded successfully.")
+            except Exception as e:
+                logger.error(f"Failed to load YOLO model: {e}")
+                raise RuntimeError(f"Failed to load YOLO model: {e}")
         
         # Define car class ID (class 2 for 'car' in COCO dataset)
         self.car_class_id = 2
         self.conf_threshold = 0.3  # Lowered confidence threshold for testing
-        self.class_names = self.model.names  # Get class names from the model
+        # Get class names from the model
+        self.class_names = detector.names if detector is not None else (
+            inference.names if inference is not None else self.model.names)
         
         # Define fixed rectangular region of interest (ROI) for intersection
         # Adjust these coordinates based on your webcam resolution
@@ -42,27 +58,25 @@ class CarIntersectionCounter:
     def detect_cars(self, frame):
         """Detect cars in the frame using YOLOv8 and return detections."""
         try:
-            results = self.model(frame, conf=self.conf_threshold, verbose=False)
-            cars = []
-            
-            logger.debug(f"Processing frame {self.frame_count} with YOLOv8.")
-            for result in results:
-                for box in result.boxes:
-                    cls_id = int(box.cls[0])
-                    conf = box.conf[0].item()
-                    
-                    # Check if the detected object is a car and meets confidence threshold
-                    if cls_id == self.car_class_id and conf > self.conf_threshold:
-                        x1, y1, x2, y2 = map(int, box.xyxy[0])
-                        cars.append([x1, y1, x2, y2, conf])
-                        logger.debug(f"Detected car at ({x1}, {y1}, {x2}, {y2}) with confidence {conf:.2f}")
+            if self.detector is not None:
+                with self.profiler.span('inference'):
+                    # Already filtered to cars above the confidence threshold
+                    cars = self.detector.detect(frame)
+            else:
+                with self.profiler.span('inference'):
+                    if self.inference is not None:
+                        results = [self.inference.predict(self.camera_id, frame, conf=self.conf_threshold, verbose=False)]
                     else:
-                        logger.debug(f"Detected non-car object (class {cls_id}, conf {conf:.2f})")
-            
-            return np.array(cars) if cars else np.array([])
+                        results = self.model(frame, conf=self.conf_threshold, verbose=False)
+                with self.profiler.span('postprocess'):
+                    # Keep only cars above the confidence threshold, as one (N, 7) array
+                    cars = results_to_array(results, classes=[self.car_class_id], min_conf=self.conf_threshold)
+            # Lazy %-formatting: nothing is formatted unless debug logging is on
+            logger.debug("Processing frame %d with YOLOv8: %d cars.", self.frame_count, len(cars))
+            return cars
         except Exception as e:
             logger.error(f"Error in detect_cars: {e}")
-            return np.array([])
+            return empty_detections()
 
     def is_car_in_roi(self, bbox):
         """Check if a car's bounding box is within the ROI."""
@@ -72,71 +86,85 @@ class CarIntersectionCounter:
         # Check if any part of the bounding box overlaps with the ROI
         return (x1 < roi_x2 and x2 > roi_x1 and y1 < roi_y2 and y2 > roi_y1)
 
-    def process_frame(self, frame):
-        """Process a frame, detect cars, count those in the ROI, and display details."""
+    def process_frame(self, frame, annotate=True):
+        """Process a frame, detect cars, count those in the ROI, and display details (annotate=False skips drawing)."""
+        profiler = self.profiler
         try:
-            # Detect cars
-            cars = self.detect_cars(frame)
-            self.car_count = 0
-            self.car_details = []  # Reset details for this frame
-            
-            for car in cars:
-                x1, y1, x2, y2, conf = car
-                in_roi = self.is_car_in_roi([x1, y1, x2, y2])
-                
-                if in_roi:
-                    self.car_count += 1
-                    color = (0, 255, 0)  # Green for cars in ROI
-                    # Store car details (x1, y1, x2, y2, confidence)
-                    self.car_details.append({
-                        'bbox': (x1, y1, x2, y2),
-                        'confidence': conf
-                    })
-                else:
-                    color = (0, 0, 255)  # Red for cars outside ROI
-                
-                # Draw bounding box
-                cv2.rectangle(frame, (x1, y1), (x2, y2), color, 2)
-                
-                # Add confidence and class name text
-                label = f"Car {conf:.2f}"
-                cv2.putText(frame, label, (x1, y1 - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
-            
-            # Draw ROI rectangle
-            cv2.rectangle(frame, (self.roi['x1'], self.roi['y1']), 
-                         (self.roi['x2'], self.roi['y2']), (255, 0, 0), 2)
-            
-            # Calculate density (cars per unit area in ROI)
-            density = (self.car_count / self.roi_area) * 1000  # Density in cars per 1000 pixels^2
-            
-            # Add car count and density text
-            cv2.putText(frame, f"Cars in Intersection: {self.car_count}", 
-                       (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
-            cv2.putText(frame, f"Density: {density:.2f} cars/1000px²", 
-                       (10, 70), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (255, 255, 255), 2)
-            
-            # Display car details on frame
-            y_offset = 110
-            for detail in self.car_details:
-                x1, y1, x2, y2 = detail['bbox']
-                conf = detail['confidence']
-                detail_text = f"Car: x1={x1}, y1={y1}, x2={x2}, y2={y2}, Conf={conf:.2f}"
-                cv2.putText(frame, detail_text, (10, y_offset), 
-                           cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
-                y_offset += 30
+            # Detect cars, reusing the previous detections when the scene is static
+            if self.motion_gate is None or self.motion_gate.should_infer(frame):
+                self.last_cars = self.detect_cars(frame)
+            cars = self.last_cars
+
+            with profiler.span('counting'):
+                # Overlap test for all boxes at once (same rule as is_car_in_roi)
+                boxes = cars[:, X1:Y2 + 1].astype(int)
+                in_roi = ((boxes[:, 0] < self.roi['x2']) & (boxes[:, 2] > self.roi['x1']) &
+                          (boxes[:, 1] < self.roi['y2']) & (boxes[:, 3] > self.roi['y1']))
+                self.car_count = int(in_roi.sum())
+                # Store car details (x1, y1, x2, y2, confidence)
+                self.car_details = [{'bbox': tuple(box), 'confidence': conf} for box, conf
+                                    in zip(boxes[in_roi].tolist(), cars[in_roi, CONF].tolist())]
+                # Calculate density (cars per unit area in ROI)
+                density = (self.car_count / self.roi_area) * 1000  # Density in cars per 1000 pixels^2
 
             self.frame_count += 1
+            if not annotate:
+                return frame
+
+            with profiler.span('render'):
+                for (x1, y1, x2, y2), conf, inside in zip(boxes.tolist(), cars[:, CONF].tolist(), in_roi.tolist()):
+                    color = (0, 255, 0) if inside else (0, 0, 255)  # Green for cars in ROI, red outside
+
+                    # Draw bounding box
+                    cv2.rectangle(frame, (x1, y1), (x2, y2), color, 2)
+
+                    # Add confidence and class name text
+                    label = f"Car {conf:.2f}"
+                    cv2.putText(frame, label, (x1, y1 - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
+
+                # Draw ROI rectangle
+                cv2.rectangle(frame, (self.roi['x1'], self.roi['y1']),
+                             (self.roi['x2'], self.roi['y2']), (255, 0, 0), 2)
+
+                # Add car count and density text
+                cv2.putText(frame, f"Cars in Intersection: {self.car_count}",
+                           (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
+                cv2.putText(frame, f"Density: {density:.2f} cars/1000px²",
+                           (10, 70), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (255, 255, 255), 2)
+
+                # Display car details on frame
+                y_offset = 110
+                for detail in self.car_details:
+                    x1, y1, x2, y2 = detail['bbox']
+                    conf = detail['confidence']
+                    detail_text = f"Car: x1={x1}, y1={y1}, x2={x2}, y2={y2}, Conf={conf:.2f}"
+                    cv2.putText(frame, detail_text, (10, y_offset),
+                               cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
+                    y_offset += 30
+
             return frame
         except Exception as e:
             logger.error(f"Error in process_frame: {e}")
             return frame
 
-def main():
+def main(source=1, headless=False, backend='torch', profile=None):
+    """
+    Detect cars in the intersection ROI from a webcam; headless=True skips all GUI calls.
+    backend='onnx' runs the model on ONNX Runtime, 'onnx-int8' on its INT8-quantized export.
+    profile='path.json' records per-stage latencies and dumps them there at exit (and on SIGUSR1).
+    """
+    profiler = StageProfiler(enabled=bool(profile))
+    if profile:
+        profiler.dump_on_signal(profile)
+    detector = None
+    if backend != 'torch':
+        from models.onnx_detector import OnnxDetector
+        detector = OnnxDetector('yolov8x.pt', conf=0.3, classes=[2], quantize=backend == 'onnx-int8')
     # Initialize the counter
-    counter = CarIntersectionCounter()
+    counter = CarIntersectionCounter(motion_gate=MotionGate(), detector=detector, profiler=profiler)
     
     # Initialize webcam (use 0 for default webcam, 1 for external)
-    cap = cv2.VideoCapture(1)
+    cap = cv2.VideoCapture(source)
     if not cap.isOpened():
         logger.error("Error: Could not open webcam.")
         return
@@ -150,39 +178,42 @@ def main():
     cap.set(cv2.CAP_PROP_FRAME_WIDTH, 800)
     cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 600)
 
-    # Window settings
-    cv2.namedWindow('Car Detection in Intersection', cv2.WINDOW_NORMAL)
+    # Paced to the camera frame rate; stops on 'q' or after 5 minutes
+    runner = PipelineRunner('Car Detection in Intersection', headless=headless,
+                            pace_fps=cap.get(cv2.CAP_PROP_FPS), max_seconds=300)
+
+    def step():
+        with profiler.span('capture'):
+            ret, frame = cap.read()
+        if not ret:
+            logger.error("Error: Could not read frame from webcam.")
+            raise StopIteration
+
+        # Process frame (nothing is drawn when there is no window to show it)
+        return counter.process_frame(frame, annotate=not headless)
     
     try:
         print("Starting car detection in intersection...")
-        start_time = time.time()
-        while True:
-            ret, frame = cap.read()
-            if not ret:
-                logger.error("Error: Could not read frame from webcam.")
-                break
-
-            # Process frame
-            processed_frame = counter.process_frame(frame)
-            
-            # Display frame
-            cv2.imshow('Car Detection in Intersection', processed_frame)
-            
-            # Break on 'q' key or after 5 minutes (optional limit)
-            if cv2.waitKey(1) & 0xFF == ord('q'):
-                break
-            if time.time() - start_time > 300:  # Stop after 5 minutes
-                logger.info("Stopping after 5 minutes.")
-                break
+        runner.run(step)
+        logger.info(runner.report())
 
     except Exception as e:
         logger.error(f"Error occurred: {str(e)}")
     finally:
         cap.release()
-        cv2.destroyAllWindows()
         logger.info(f"Total cars detected in intersection: {counter.car_count}")
         logger.info(f"Final car details: {counter.car_details}")
         logger.info(f"Total frames processed: {counter.frame_count}")
+        logger.info(f"Motion gate skipped {counter.motion_gate.skip_ratio:.0%} of inferences")
+        if profile:
+            logger.info("Stage latencies:\n%s", profiler.finish(profile))
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Car detection in an intersection ROI")
+    parser.add_argument('--source', type=int, default=1, help="camera index (default: external webcam 1)")
+    parser.add_argument('--headless', action='store_true', help="run without any GUI calls")
+    parser.add_argument('--backend', choices=['torch', 'onnx', 'onnx-int8'], default='torch',
+                        help="inference backend (onnx backends run on CPU via ONNX Runtime)")
+    parser.add_argument('--profile', help="write per-stage latency histograms to this JSON file")
+    args = parser.parse_args()
+    main(source=args.source, headless=args.headless, backend=args.backend, profile=args.profile)
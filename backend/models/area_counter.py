@@ -1,8 +1,126 @@
 import numpy as np
 import cv2
+from models.rolling_stats import RollingLaneStats
+
+# Neighbouring grid cells to probe for each point; together with pairs inside
+# the same cell this visits every unordered pair of adjacent cells exactly once
+_HALF_NEIGHBOURHOOD = ((0, 1), (1, -1), (1, 0), (1, 1))
+
+
+def dedup_centers(centers, radius, groups=None):
+    """
+    Greedy proximity dedup of (x, y) centers using a uniform spatial hash.
+
+    A center is dropped when it lies closer than `radius` to an earlier center
+    that was kept (the same result as a sequential pairwise check), but
+    candidate pairs are only generated between neighbouring grid cells.
+    `groups` (e.g. frame or camera ids) keeps centers of different groups from
+    ever suppressing each other. Returns a boolean keep mask.
+    """
+    centers = np.asarray(centers).reshape(-1, 2)
+    n = len(centers)
+    keep = np.ones(n, dtype=bool)
+    if n < 2 or radius <= 0:
+        return keep
+
+    cells = np.floor_divide(centers, radius).astype(np.int64)
+    cells -= cells.min(axis=0) - 1  # Shift so neighbour offsets stay non-negative
+    span = int(cells[:, 1].max()) + 2
+    keys = cells[:, 0] * span + cells[:, 1]
+    if groups is not None:
+        keys += np.asarray(groups, dtype=np.int64) * ((int(cells[:, 0].max()) + 2) * span)
+
+    order = np.argsort(keys, kind='stable')
+    sorted_keys = keys[order]
+
+    # Candidate pairs: later points in the same cell, then all points in each
+    # half-neighbourhood cell (positions refer to the sorted order)
+    ranges = [(np.arange(1, n + 1), np.searchsorted(sorted_keys, sorted_keys, side='right'))]
+    for dx, dy in _HALF_NEIGHBOURHOOD:
+        target = sorted_keys + dx * span + dy
+        ranges.append((np.searchsorted(sorted_keys, target, side='left'),
+                       np.searchsorted(sorted_keys, target, side='right')))
+
+    i_parts, j_parts = [], []
+    for start, stop in ranges:
+        counts = stop - start
+        total = int(counts.sum())
+        if not total:
+            continue
+        offsets = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+        i_parts.append(np.repeat(np.arange(n), counts))
+        j_parts.append(np.repeat(start, counts) + offsets)
+    if not i_parts:
+        return keep
+
+    a = order[np.concatenate(i_parts)]
+    b = order[np.concatenate(j_parts)]
+    diff = centers[a].astype(np.float64) - centers[b]
+    close = np.einsum('ij,ij->i', diff, diff) < radius * radius
+    if not close.any():
+        return keep
+
+    # Resolve the (sparse) conflicts in original order: a point only suppresses
+    # later neighbours if it survived itself
+    first = np.minimum(a[close], b[close])
+    second = np.maximum(a[close], b[close])
+    pair_order = np.argsort(first, kind='stable')
+    first, second = first[pair_order], second[pair_order]
+    for i, j in zip(first.tolist(), second.tolist()):
+        if keep[i]:
+            keep[j] = False
+    return keep
+
+
+def box_centers(detections):
+    """Integer (x, y) centers of the (x1, y1, x2, y2) boxes in an (N, 4+) array."""
+    boxes = np.asarray(detections)[:, :4].astype(np.int64)
+    return np.stack([(boxes[:, 0] + boxes[:, 2]) // 2,
+                     (boxes[:, 1] + boxes[:, 3]) // 2], axis=1)
+
+
+def count_densities(counts, areas, avg_vehicle_area):
+    """
+    Count-based density model for (..., lanes) counts and broadcastable ROI areas.
+
+    Returns per-lane densities and the mean density over lanes that have a ROI.
+    """
+    counts = np.asarray(counts, dtype=np.float64)
+    areas = np.broadcast_to(np.asarray(areas, dtype=np.float64), counts.shape)
+    valid = areas > 0
+    # Apply non-linear scaling for congestion, with boundary adjustment
+    vehicle_area = counts * avg_vehicle_area
+    density = np.divide(vehicle_area, areas, out=np.zeros_like(counts), where=valid) * 100 * (1 + counts * 0.05)
+    densities = np.where(valid, np.where(density < 100, density, 99.9), 0.0)  # Cap at 99.9 to avoid 100% saturation
+    return densities, _mean_over_valid(densities, valid)
+
+
+def occupancy_densities(covered, lane_pixels):
+    """Occupancy density (% of lane pixels covered) for (..., lanes) covered-pixel counts."""
+    covered = np.asarray(covered, dtype=np.float64)
+    lane_pixels = np.broadcast_to(np.asarray(lane_pixels, dtype=np.float64), covered.shape)
+    valid = lane_pixels > 0
+    densities = np.minimum(np.divide(covered, lane_pixels, out=np.zeros_like(covered), where=valid) * 100, 99.9)
+    return densities, _mean_over_valid(densities, valid)
+
+
+def _mean_over_valid(densities, valid):
+    n_valid = valid.sum(axis=-1)
+    total = np.where(valid, densities, 0.0).sum(axis=-1)
+    return np.divide(total, n_valid, out=np.zeros_like(total), where=n_valid > 0)
+
 
 class AreaVehicleCounter:
-    def __init__(self):
+    DENSITY_MODES = ('approx', 'occupancy')
+
+    def __init__(self, density_mode='approx'):
+        """
+        density_mode='approx' estimates density from vehicle counts and a
+        nominal vehicle area; 'occupancy' measures the fraction of each lane
+        ROI actually covered by detection boxes.
+        """
+        if density_mode not in self.DENSITY_MODES:
+            raise ValueError(f"Invalid density mode: {density_mode}")
         self.lane_rois = {
             'north': None,
             'south': None,
@@ -13,13 +131,23 @@ class AreaVehicleCounter:
         self.lane_densities = {lane: 0.0 for lane in self.lane_rois}
         self.density_percentage = 0.0
         self.avg_vehicle_area = 800  # Can be fine-tuned based on observation
+        self.merge_radius = 30  # Centers closer than this (px) are treated as one vehicle
         self.rois_initialized = False
+        self.density_mode = density_mode
+        self.lane_names = list(self.lane_rois)
+        self._roi_areas = None  # Cached contour areas in lane_names order
+        self._lane_raster = None  # Per-pixel lane ids: 0 = no lane, i + 1 = lane_names[i]
+        self._raster_shape = None  # Frame shape the raster was compiled for
+        self._lane_sats = None  # (lanes, H + 1, W + 1) summed-area tables of the lane masks
+        self._lane_pixels = None  # Pixel area of each lane mask
+        self.stats = RollingLaneStats(self.lane_names)  # Rolling per-lane density statistics
 
     def reset(self):
         """Reset counters and densities to initial state."""
         self.lane_counts = {lane: 0 for lane in self.lane_rois}
         self.lane_densities = {lane: 0.0 for lane in self.lane_rois}
         self.density_percentage = 0.0
+        self.stats.reset()
         return self.lane_counts, self.lane_densities
 
     def set_lane_roi(self, lane, points):
@@ -30,6 +158,8 @@ class AreaVehicleCounter:
             raise ValueError("ROI must have at least 3 points")
         self.lane_rois[lane] = np.array(points, dtype=np.int32)
         self.rois_initialized = True
+        self._lane_raster = None  # Recompiled on the next lookup
+        self._roi_areas = None
 
     def calculate_roi_area(self, lane):
         """Calculate the area of a lane ROI."""
@@ -38,62 +168,211 @@ class AreaVehicleCounter:
         roi = self.lane_rois[lane]
         return cv2.contourArea(roi) if roi is not None else 0
 
+    def _lane_areas(self):
+        if self._roi_areas is None:
+            self._roi_areas = np.array([self.calculate_roi_area(lane) for lane in self.lane_names],
+                                       dtype=np.float64)
+        return self._roi_areas
+
+    def compile_lane_raster(self, frame_shape):
+        """Rasterize the lane ROIs into a per-pixel lane-id map covering the given frame shape."""
+        # Grow past the frame where ROIs touch its far edges (e.g. y == h) so
+        # boundary points still resolve to their lane
+        extent_h, extent_w = self._roi_extent()
+        h, w = max(frame_shape[0], extent_h), max(frame_shape[1], extent_w)
+        raster = np.zeros((h, w), dtype=np.uint8)
+        # Paint in reverse so earlier lanes win where ROIs overlap, like the
+        # first-match order of a per-lane pointPolygonTest loop
+        for idx in range(len(self.lane_names) - 1, -1, -1):
+            roi = self.lane_rois[self.lane_names[idx]]
+            if roi is not None:
+                cv2.fillPoly(raster, [roi], idx + 1)
+        self._lane_raster = raster
+        self._raster_shape = tuple(frame_shape[:2])
+        self._lane_sats = None
+        return raster
+
+    def _build_lane_sats(self):
+        """One summed-area table per lane mask of the current lane raster."""
+        sats = np.empty((len(self.lane_names),) + tuple(np.add(self._lane_raster.shape, 1)), dtype=np.int32)
+        for idx in range(len(self.lane_names)):
+            mask = (self._lane_raster == idx + 1).astype(np.uint8)
+            sats[idx] = cv2.integral(mask)
+        return sats
+
+    def _compile_lane_sats(self):
+        self._lane_sats = self._build_lane_sats()
+        self._lane_pixels = self._lane_sats[:, -1, -1].astype(np.float64)
+
+    def lane_geometry(self, frame_shape, with_sats=False):
+        """
+        Compiled lane lookup state for a frame shape, as (raster, areas, sats):
+        the per-pixel lane-id map, the ROI areas in lane_names order and, if
+        requested, fresh per-lane summed-area tables (else None) that the
+        counter does not keep. Default ROIs are applied if none were set.
+        Used by models.counter_pool to stack cameras.
+        """
+        if not self.rois_initialized:
+            self._set_default_rois(frame_shape)
+        raster = self.compile_lane_raster(frame_shape)
+        sats = self._build_lane_sats() if with_sats else None
+        return raster, self._lane_areas(), sats
+
+    def covered_pixels(self, boxes, frame_ids, n_frames):
+        """
+        Lane pixels covered by (x1, y1, x2, y2) boxes, summed per frame.
+
+        Each box costs four table lookups per lane, independent of its size.
+        Overlapping boxes are counted once per box. Returns (n_frames, lanes).
+        """
+        if self._lane_sats is None:
+            self._compile_lane_sats()
+        n_lanes = len(self.lane_names)
+        h, w = self._lane_raster.shape
+        boxes = np.asarray(boxes, dtype=np.int64).reshape(-1, 4)
+        x1, x2 = np.clip(boxes[:, 0], 0, w), np.clip(boxes[:, 2], 0, w)
+        y1, y2 = np.clip(boxes[:, 1], 0, h), np.clip(boxes[:, 3], 0, h)
+        sats = self._lane_sats
+        covered = (sats[:, y2, x2] - sats[:, y1, x2] - sats[:, y2, x1] + sats[:, y1, x1]).astype(np.float64)
+        covered *= (x2 > x1) & (y2 > y1)  # Inverted boxes cover nothing
+
+        flat = (np.asarray(frame_ids, dtype=np.int64)[None, :] * n_lanes + np.arange(n_lanes)[:, None]).ravel()
+        return np.bincount(flat, weights=covered.ravel(),
+                           minlength=n_frames * n_lanes).reshape(n_frames, n_lanes)
+
+    def densities_from_occupancy(self, covered):
+        """Occupancy density (% of lane pixels covered) for an (..., lanes) covered-pixel array."""
+        if self._lane_sats is None:
+            self._compile_lane_sats()
+        return occupancy_densities(covered, self._lane_pixels)
+
+    def _roi_extent(self):
+        """Smallest (h, w) frame shape that contains every lane ROI."""
+        rois = [roi for roi in self.lane_rois.values() if roi is not None]
+        if not rois:
+            return (1, 1)
+        pts = np.concatenate(rois)
+        return (int(pts[:, 1].max()) + 1, int(pts[:, 0].max()) + 1)
+
+    def assign_lanes(self, centers, frame_shape=None):
+        """Return the lane index of each (x, y) center, or -1 when it lies outside every ROI."""
+        if frame_shape is not None:
+            shape = tuple(frame_shape[:2])
+        else:
+            shape = self._raster_shape or self._roi_extent()
+        if self._lane_raster is None or self._raster_shape != shape:
+            self.compile_lane_raster(shape)
+
+        centers = np.asarray(centers, dtype=np.int64).reshape(-1, 2)
+        h, w = self._lane_raster.shape
+        xs, ys = centers[:, 0], centers[:, 1]
+        inside = (xs >= 0) & (xs < w) & (ys >= 0) & (ys < h)
+        lanes = np.full(len(centers), -1, dtype=np.int64)
+        lanes[inside] = self._lane_raster[ys[inside], xs[inside]].astype(np.int64) - 1
+        return lanes
+
+    @staticmethod
+    def as_detection_array(detections):
+        """Coerce detections to an (N, 5+) array, treating malformed input as empty."""
+        detections = np.asarray(detections)
+        if detections.size and (detections.ndim != 2 or detections.shape[1] < 5):
+            print(f"Warning: Invalid detection format - expected (N, 5+) array, got {detections.shape}")
+            return np.empty((0, 5))
+        return detections if detections.size else np.empty((0, 5))
+
+    def _measure(self, detections, frame_ids, n_frames, frame_shape=None):
+        """
+        Dedup, lane-assign and score a stacked detection array.
+
+        Returns (counts, densities, overall) with one row per frame.
+        """
+        n_lanes = len(self.lane_names)
+        counts = np.zeros((n_frames, n_lanes), dtype=np.int64)
+        covered = np.zeros((n_frames, n_lanes))
+        if len(detections):
+            boxes = detections[:, :4].astype(np.int64)
+            centers = box_centers(boxes)
+
+            # Avoid double-counting by checking proximity to existing centers
+            # (only within the same frame)
+            keep = dedup_centers(centers, self.merge_radius, groups=frame_ids if n_frames > 1 else None)
+
+            # Assign every kept center to a lane with a single raster lookup
+            lanes = self.assign_lanes(centers[keep], frame_shape)
+            hit = lanes >= 0
+            flat = frame_ids[keep][hit] * n_lanes + lanes[hit]
+            counts = np.bincount(flat, minlength=n_frames * n_lanes).reshape(n_frames, n_lanes)
+            if self.density_mode == 'occupancy':
+                covered = self.covered_pixels(boxes[keep], frame_ids[keep], n_frames)
+        elif self.density_mode == 'occupancy' and self._lane_raster is None:
+            self.assign_lanes(np.empty((0, 2)), frame_shape)  # Compile the raster for the lane areas
+
+        if self.density_mode == 'occupancy':
+            densities, overall = self.densities_from_occupancy(covered)
+        else:
+            densities, overall = self.densities_from_counts(counts)
+        return counts, densities, overall
+
+    def densities_from_counts(self, counts):
+        """
+        Vectorized density model for an (..., lanes) count array.
+
+        Returns per-lane densities of the same shape and the mean density over
+        lanes that have a ROI.
+        """
+        return count_densities(counts, self._lane_areas(), self.avg_vehicle_area)
+
     def update(self, detections, frame_shape=None):
         """Update vehicle counts and densities based on detections, with improved accuracy."""
-        self.lane_counts = {lane: 0 for lane in self.lane_rois}
-        vehicle_centers = []
-        
         if frame_shape and not self.rois_initialized:
             self._set_default_rois(frame_shape)
             
-        if not detections.size:
-            self.lane_densities = {lane: 0.0 for lane in self.lane_rois}
-            self.density_percentage = 0.0
-            return self.lane_counts, self.lane_densities
-            
-        for det in detections:
-            if len(det) < 5:
-                continue
-            try:
-                x1, y1, x2, y2, track_id = map(int, det[:5])
-                center = ((x1 + x2) // 2, (y1 + y2) // 2)
-                
-                # Avoid double-counting by checking proximity to existing centers
-                if any(np.linalg.norm(np.array(center) - np.array(c)) < 30 for c in vehicle_centers):
-                    continue
-                vehicle_centers.append(center)
-                
-                # Assign to lane with highest containment, considering boundary overlap
-                best_lane = None
-                max_containment = -float('inf')  # Use negative infinity for initial max
-                for lane, roi in self.lane_rois.items():
-                    if roi is not None:
-                        containment = cv2.pointPolygonTest(roi, center, False)
-                        if containment >= 0 and containment > max_containment:
-                            max_containment = containment
-                            best_lane = lane
-                if best_lane:
-                    self.lane_counts[best_lane] += 1
-            except (ValueError, TypeError) as e:
-                print(f"Warning: Invalid detection format - {e}")
-                continue
-        
-        # Calculate densities with refined overlap handling
-        total_density = 0.0
-        valid_lanes = 0
-        for lane in self.lane_rois:
-            area = self.calculate_roi_area(lane)
-            if area > 0:
-                vehicle_area = self.lane_counts[lane] * self.avg_vehicle_area
-                # Apply non-linear scaling for congestion, with boundary adjustment
-                density = min(100.0, (vehicle_area / area) * 100 * (1 + self.lane_counts[lane] * 0.05))
-                self.lane_densities[lane] = density if density < 100 else 99.9  # Cap at 99.9 to avoid 100% saturation
-                total_density += self.lane_densities[lane]
-                valid_lanes += 1
-        
-        self.density_percentage = total_density / valid_lanes if valid_lanes > 0 else 0.0
+        detections = self.as_detection_array(detections)
+        counts, densities, overall = self._measure(
+            detections, np.zeros(len(detections), dtype=np.int64), 1, frame_shape)
+        counts, densities, overall = counts[0], densities[0], overall[0]
+
+        self.lane_counts = {lane: int(counts[idx]) for idx, lane in enumerate(self.lane_names)}
+        self.lane_densities = {lane: float(densities[idx]) for idx, lane in enumerate(self.lane_names)}
+        self.density_percentage = float(overall)
+        self.stats.update(densities)
         return self.lane_counts, self.lane_densities
 
+    def update_batch(self, detections, offsets=None, frame_shape=None):
+        """
+        Offline counterpart of `update` for many frames at once.
+
+        `detections` is either a list of per-frame (N_t, 5+) arrays, or one
+        stacked (N, 5+) array together with CSR-style `offsets` of length T + 1
+        (frame t owns rows offsets[t]:offsets[t + 1]). Dedup, lane assignment
+        and densities run as a single vectorized pass over all frames.
+
+        Returns (counts, densities) as dense (T, lanes) arrays, with lanes in
+        `lane_names` order. Per-frame state (`lane_counts`, ...) is untouched.
+        """
+        if frame_shape and not self.rois_initialized:
+            self._set_default_rois(frame_shape)
+
+        if offsets is None:
+            frames = [self.as_detection_array(det) for det in detections]
+            n_frames = len(frames)
+            sizes = np.array([len(det) for det in frames], dtype=np.int64)
+            width = min((det.shape[1] for det in frames if len(det)), default=5)
+            stacked = np.concatenate([det[:, :width] for det in frames]) if sizes.sum() else np.empty((0, 5))
+        else:
+            offsets = np.asarray(offsets, dtype=np.int64)
+            if offsets.ndim != 1 or len(offsets) < 1 or offsets[0] != 0 or np.any(np.diff(offsets) < 0):
+                raise ValueError("offsets must be a non-decreasing 1-D array starting at 0")
+            stacked = self.as_detection_array(detections)
+            if offsets[-1] != len(stacked):
+                raise ValueError(f"offsets end at {offsets[-1]} but detections has {len(stacked)} rows")
+            n_frames = len(offsets) - 1
+            sizes = np.diff(offsets)
+
+        frame_ids = np.repeat(np.arange(n_frames), sizes)
+        counts, densities, _ = self._measure(stacked, frame_ids, n_frames, frame_shape)
+        return counts, densities
+
     def _set_default_rois(self, shape):
         """Set default ROIs to match the wider road layout (200-600 for NS, 150-450 for EW)."""
         h, w = shape[:2]
@@ -0,0 +1,142 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+class _Request:
+    __slots__ = ('camera_id', 'frame', 'kwargs', 'future', 'submitted')
+
+    def __init__(self, camera_id, frame, kwargs):
+        self.camera_id = camera_id
+        self.frame = frame
+        self.kwargs = kwargs
+        self.future = Future()
+        self.submitted = time.monotonic()
+
+
+class BatchInferenceService:
+    """
+    Shares one detection model between several cameras by batching their frames.
+
+    Pipelines submit frames from any thread; a worker thread gathers up to
+    `max_batch` of them, waiting at most `max_wait` seconds after the first
+    one arrives, runs a single batched model call and hands each camera its
+    own result. `model` is an ultralytics YOLO (or any callable that maps a
+    list of frames to a list of per-frame results). `predict_kwargs` are the
+    defaults for every call; each request can override them, and only requests
+    with the same kwargs share a batch. With a single camera registered there
+    is nobody to wait for, so its frames run immediately.
+    """
+
+    def __init__(self, model, max_batch=4, max_wait=0.02, **predict_kwargs):
+        if max_batch < 1:
+            raise ValueError("max_batch must be at least 1")
+        self.model = model
+        self.names = getattr(model, 'names', None)
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.predict_kwargs = predict_kwargs
+        self.predict_kwargs.setdefault('verbose', False)
+
+        self.batches = 0
+        self.frames = 0
+        self.cameras = set()  # Cameras that have submitted frames
+        self._held = []  # Requests pulled off the queue that did not fit the last batch
+        self._queue = queue.Queue()
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="batch-inference", daemon=True)
+        self._thread.start()
+
+    @property
+    def avg_batch_size(self):
+        return self.frames / self.batches if self.batches else 0.0
+
+    def register(self, camera_id):
+        """Announce a camera up front, so batching waits for it from its first frame."""
+        self.cameras.add(camera_id)
+
+    def submit(self, camera_id, frame, **predict_kwargs):
+        """Queue a frame and return a Future for its per-frame result."""
+        if not self._running:
+            raise RuntimeError("Inference service has been stopped")
+        self.cameras.add(camera_id)
+        request = _Request(camera_id, frame, {**self.predict_kwargs, **predict_kwargs})
+        self._queue.put(request)
+        return request.future
+
+    def predict(self, camera_id, frame, timeout=None, **predict_kwargs):
+        """Blocking submit: the detection result for this camera's frame."""
+        return self.submit(camera_id, frame, **predict_kwargs).result(timeout)
+
+    def _take_held(self, kwargs):
+        for i, request in enumerate(self._held):
+            if kwargs is None or request.kwargs == kwargs:
+                return self._held.pop(i)
+        return None
+
+    def _collect(self):
+        """Block for one request, then gather more until the batch is full or its wait budget is spent."""
+        first = self._take_held(None) or self._queue.get()
+        if first is None:
+            self._running = False
+            return []
+        batch = [first]
+        while len(batch) < self.max_batch:
+            request = self._take_held(first.kwargs)
+            if request is None:
+                break
+            batch.append(request)
+
+        # A lone camera can't fill the batch, so don't make it wait
+        deadline = first.submitted + (self.max_wait if len(self.cameras) > 1 else 0.0)
+        while len(batch) < self.max_batch and self._running:
+            remaining = deadline - time.monotonic()
+            try:
+                request = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if request is None:
+                self._running = False
+                break
+            if request.kwargs == first.kwargs:
+                batch.append(request)
+            else:
+                self._held.append(request)  # Different settings: starts a later batch
+        return batch
+
+    def _run(self):
+        while self._running or self._held:
+            batch = self._collect()
+            if not batch:
+                break
+            try:
+                results = self.model([request.frame for request in batch], **batch[0].kwargs)
+            except Exception as e:
+                for request in batch:
+                    request.future.set_exception(e)
+                continue
+            self.batches += 1
+            self.frames += len(batch)
+            for request, result in zip(batch, results):
+                request.future.set_result(result)
+
+    def stop(self):
+        """Finish queued batches and stop the worker; anything still pending fails."""
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join(timeout=5.0)
+        self._running = False
+        pending = []
+        if not self._thread.is_alive():  # Otherwise the worker still owns its held requests
+            pending, self._held = self._held, []
+        while True:
+            try:
+                request = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if request is not None:
+                pending.append(request)
+        error = RuntimeError("Inference service stopped before this frame was processed")
+        for request in pending:
+            if request.future.set_running_or_notify_cancel():
+                request.future.set_exception(error)
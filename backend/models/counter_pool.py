@@ -0,0 +1,143 @@
+import numpy as np
+from models.area_counter import (AreaVehicleCounter, box_centers, count_densities, dedup_centers,
+                                 occupancy_densities)
+from models.rolling_stats import RollingLaneStats
+
+class AreaCounterPool:
+    """
+    Lane counting for many cameras in one vectorized pass.
+
+    Each camera keeps its own AreaVehicleCounter for ROI configuration, but
+    their lane rasters (and, in occupancy mode, summed-area tables) are stacked
+    so detections from every camera are deduplicated, lane-assigned and scored
+    together. All cameras must share one frame shape.
+    """
+
+    def __init__(self, n_cameras, frame_shape, density_mode='approx'):
+        if n_cameras < 1:
+            raise ValueError("Pool needs at least one camera")
+        self.frame_shape = tuple(frame_shape[:2])
+        self.counters = [AreaVehicleCounter(density_mode) for _ in range(n_cameras)]
+        self.density_mode = density_mode
+        self.lane_names = self.counters[0].lane_names
+
+        shape = (n_cameras, len(self.lane_names))
+        self.counts = np.zeros(shape, dtype=np.int64)
+        self.densities = np.zeros(shape)
+        self.density_percentage = np.zeros(n_cameras)
+        # Flattened camera-major so stats.ewma.reshape(shape) is a view
+        self.stats = RollingLaneStats([f"{cam}:{lane}" for cam in range(n_cameras) for lane in self.lane_names])
+        self._rasters = None
+
+    @property
+    def n_cameras(self):
+        return len(self.counters)
+
+    # Tuning lives on the counters (camera 0 is the reference); setting it on the pool sets every camera
+    @property
+    def merge_radius(self):
+        return self.counters[0].merge_radius
+
+    @merge_radius.setter
+    def merge_radius(self, radius):
+        for counter in self.counters:
+            counter.merge_radius = radius
+
+    @property
+    def avg_vehicle_area(self):
+        return self.counters[0].avg_vehicle_area
+
+    @avg_vehicle_area.setter
+    def avg_vehicle_area(self, area):
+        for counter in self.counters:
+            counter.avg_vehicle_area = area
+
+    def reset(self):
+        self.counts.fill(0)
+        self.densities.fill(0)
+        self.density_percentage.fill(0)
+        self.stats.reset()
+
+    def set_lane_roi(self, camera, lane, points):
+        """Set the ROI of one lane of one camera."""
+        self.counters[camera].set_lane_roi(lane, points)
+        self._rasters = None
+
+    def _compile(self):
+        """Stack the per-camera lane rasters (and SATs for occupancy) into common arrays."""
+        occupancy = self.density_mode == 'occupancy'
+        geometry = [counter.lane_geometry(self.frame_shape, with_sats=occupancy) for counter in self.counters]
+
+        h = max(raster.shape[0] for raster, _, _ in geometry)
+        w = max(raster.shape[1] for raster, _, _ in geometry)
+        self._rasters = np.zeros((self.n_cameras, h, w), dtype=np.uint8)
+        for cam, (raster, _, _) in enumerate(geometry):
+            ch, cw = raster.shape
+            self._rasters[cam, :ch, :cw] = raster
+        self._areas = np.stack([areas for _, areas, _ in geometry])
+
+        if occupancy:
+            self._sats = np.zeros((self.n_cameras, len(self.lane_names), h + 1, w + 1), dtype=np.int32)
+            for cam, (_, _, sats) in enumerate(geometry):
+                _, sh, sw = sats.shape
+                self._sats[cam, :, :sh, :sw] = sats
+                # Carry the last row/column out so padded lookups stay exact
+                self._sats[cam, :, sh:, :sw] = sats[:, -1:, :]
+                self._sats[cam, :, :, sw:] = self._sats[cam, :, :, sw - 1:sw]
+            self._lane_pixels = self._sats[:, :, -1, -1].astype(np.float64)
+
+    def update(self, detections, camera_ids):
+        """
+        Update every camera from one stacked (M, 5+) detection array.
+
+        `camera_ids` gives the camera index of each row. Returns (counts,
+        densities) as (n_cameras, lanes) arrays in `lane_names` order; they
+        are copies, so they stay valid after the next update (self.counts and
+        self.densities are the pool's own buffers).
+        """
+        if self._rasters is None:
+            self._compile()
+        detections = AreaVehicleCounter.as_detection_array(detections)
+        camera_ids = np.asarray(camera_ids, dtype=np.int64).reshape(-1)
+        if len(camera_ids) != len(detections):
+            raise ValueError(f"Got {len(camera_ids)} camera ids for {len(detections)} detections")
+        if len(camera_ids) and (camera_ids.min() < 0 or camera_ids.max() >= self.n_cameras):
+            raise ValueError(f"Camera ids must be in [0, {self.n_cameras})")
+
+        n_cameras, n_lanes = self.counts.shape
+        self.counts.fill(0)
+        covered = np.zeros((n_cameras, n_lanes))
+        if len(detections):
+            boxes = detections[:, :4].astype(np.int64)
+            centers = box_centers(boxes)
+            keep = dedup_centers(centers, self.merge_radius, groups=camera_ids)
+            boxes, centers, cams = boxes[keep], centers[keep], camera_ids[keep]
+
+            _, h, w = self._rasters.shape
+            xs, ys = centers[:, 0], centers[:, 1]
+            inside = (xs >= 0) & (xs < w) & (ys >= 0) & (ys < h)
+            lanes = np.full(len(centers), -1, dtype=np.int64)
+            lanes[inside] = self._rasters[cams[inside], ys[inside], xs[inside]].astype(np.int64) - 1
+            hit = lanes >= 0
+            self.counts[:] = np.bincount(cams[hit] * n_lanes + lanes[hit],
+                                         minlength=n_cameras * n_lanes).reshape(n_cameras, n_lanes)
+
+            if self.density_mode == 'occupancy':
+                x1, x2 = np.clip(boxes[:, 0], 0, w), np.clip(boxes[:, 2], 0, w)
+                y1, y2 = np.clip(boxes[:, 1], 0, h), np.clip(boxes[:, 3], 0, h)
+                sats = self._sats
+                per_box = (sats[cams, :, y2, x2] - sats[cams, :, y1, x2]
+                           - sats[cams, :, y2, x1] + sats[cams, :, y1, x1]).astype(np.float64)
+                per_box *= ((x2 > x1) & (y2 > y1))[:, None]
+                flat = (cams[:, None] * n_lanes + np.arange(n_lanes)[None, :]).ravel()
+                covered = np.bincount(flat, weights=per_box.ravel(),
+                                      minlength=n_cameras * n_lanes).reshape(n_cameras, n_lanes)
+
+        if self.density_mode == 'occupancy':
+            densities, overall = occupancy_densities(covered, self._lane_pixels)
+        else:
+            densities, overall = count_densities(self.counts, self._areas, self.avg_vehicle_area)
+        self.densities[:] = densities
+        self.density_percentage[:] = overall
+        self.stats.update(self.densities.ravel())
+        return self.counts.copy(), self.densities.copy()
@@ -0,0 +1,57 @@
+import numpy as np
+
+# Column layout of the detection arrays every counter consumes
+X1, Y1, X2, Y2, TRACK_ID, CONF, CLS = range(7)
+NUM_COLUMNS = 7
+
+
+def empty_detections():
+    return np.empty((0, NUM_COLUMNS), dtype=np.float32)
+
+
+def results_to_array(results, classes=None, min_conf=None, frame_shape=None):
+    """
+    Convert ultralytics results into one (N, 7) float32 detection array.
+
+    Columns are [x1, y1, x2, y2, track_id, conf, cls]; track_id is the row
+    index within the frame until a tracker assigns persistent ids. `results`
+    may be a single Results object or a list of them (rows are concatenated).
+    Class filtering, confidence filtering (conf > min_conf) and clipping to
+    `frame_shape` are all done with NumPy on the whole box tensor.
+    """
+    if not isinstance(results, (list, tuple)):
+        results = [results]
+    parts = []
+    for result in results:
+        boxes = result.boxes
+        if boxes is None or not len(boxes):
+            continue
+        part = np.empty((len(boxes), NUM_COLUMNS), dtype=np.float32)
+        part[:, X1:Y2 + 1] = boxes.xyxy.cpu().numpy()
+        part[:, CONF] = boxes.conf.cpu().numpy()
+        part[:, CLS] = boxes.cls.cpu().numpy()
+        parts.append(part)
+    if not parts:
+        return empty_detections()
+    detections = np.concatenate(parts) if len(parts) > 1 else parts[0]
+
+    keep = np.ones(len(detections), dtype=bool)
+    if classes is not None:
+        keep &= np.isin(detections[:, CLS], np.asarray(list(classes), dtype=np.float32))
+    if min_conf is not None:
+        keep &= detections[:, CONF] > min_conf
+    detections = detections[keep]
+
+    if frame_shape is not None:
+        clip_detections(detections, frame_shape)
+    detections[:, TRACK_ID] = np.arange(len(detections))
+    return detections
+
+
+def clip_detections(detections, frame_shape):
+    """Clip box coordinates to the frame in place, to avoid out-of-bounds errors downstream."""
+    h, w = frame_shape[:2]
+    xs, ys = detections[:, X1:X2 + 1:2], detections[:, Y1:Y2 + 1:2]  # Views
+    np.clip(xs, 0, w - 1, out=xs)
+    np.clip(ys, 0, h - 1, out=ys)
+    return detections
@@ -1,43 +1,355 @@
+import hashlib
+import os
 import numpy as np
 import cv2
+from models.rolling_stats import RollingLaneStats
+
+class GroundHomography:
+    """
+    Calibrated image-to-ground-plane mapping for one camera.
+
+    Built from 4+ image points (pixels) and their ground positions (metres).
+    All transforms are a single 3x3 matrix product over whole point arrays;
+    warped bird's-eye debug views use cv2.remap tables that are built once and
+    can be cached on disk.
+    """
+
+    def __init__(self, image_points, ground_points):
+        image_points = np.asarray(image_points, dtype=np.float32).reshape(-1, 2)
+        ground_points = np.asarray(ground_points, dtype=np.float32).reshape(-1, 2)
+        if len(image_points) < 4 or len(image_points) != len(ground_points):
+            raise ValueError("Need at least 4 matching image/ground point pairs")
+        if len(image_points) == 4:
+            self.matrix = cv2.getPerspectiveTransform(image_points, ground_points)
+        else:
+            self.matrix, _ = cv2.findHomography(image_points, ground_points, cv2.RANSAC)
+            if self.matrix is None:
+                raise ValueError("Could not estimate a homography from the given points")
+        self.inverse = np.linalg.inv(self.matrix)
+        self._remap_cache = {}
+
+    @classmethod
+    def from_matrix(cls, matrix):
+        obj = cls.__new__(cls)
+        obj.matrix = np.asarray(matrix, dtype=np.float64).reshape(3, 3)
+        obj.inverse = np.linalg.inv(obj.matrix)
+        obj._remap_cache = {}
+        return obj
+
+    def save(self, path):
+        np.save(path, self.matrix)
+
+    @classmethod
+    def load(cls, path):
+        return cls.from_matrix(np.load(path))
+
+    @staticmethod
+    def _apply(matrix, points):
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        mapped = points @ matrix[:, :2].T + matrix[:, 2]
+        return mapped[:, :2] / mapped[:, 2:3]
+
+    def to_ground(self, points):
+        """Map (N, 2) image points to ground-plane metres."""
+        return self._apply(self.matrix, points)
+
+    def to_image(self, points):
+        """Map (N, 2) ground-plane points (metres) back to image pixels."""
+        return self._apply(self.inverse, points)
+
+    def footprints(self, boxes):
+        """Ground position of each (x1, y1, x2, y2) box, taken at its bottom-center contact point."""
+        boxes = np.asarray(boxes, dtype=np.float64)
+        boxes = boxes.reshape(-1, boxes.shape[-1]) if boxes.size else np.empty((0, 4))
+        return self.to_ground(np.stack([(boxes[:, 0] + boxes[:, 2]) / 2, boxes[:, 3]], axis=1))
+
+    def polygon_metrics(self, polygon):
+        """Ground area (m^2) and length (m, long side of the min-area rectangle) of an image polygon."""
+        ground = self.to_ground(polygon).astype(np.float32)
+        area = cv2.contourArea(ground)
+        _, (w, h), _ = cv2.minAreaRect(ground)
+        return area, max(w, h)
+
+    def remap_tables(self, out_size, metres_per_pixel, origin=(0.0, 0.0), cache_dir=None):
+        """
+        cv2.remap lookup tables for a bird's-eye view of the ground plane.
+
+        Output pixel (u, v) shows ground point origin + (u, v) * metres_per_pixel.
+        Tables are memoised per parameters and, with `cache_dir`, stored as
+        .npz files keyed by a hash of the matrix and parameters.
+        """
+        key = (tuple(out_size), float(metres_per_pixel), tuple(origin))
+        if key in self._remap_cache:
+            return self._remap_cache[key]
+
+        path = None
+        if cache_dir is not None:
+            digest = hashlib.sha1(self.matrix.tobytes() + repr(key).encode()).hexdigest()[:16]
+            path = os.path.join(cache_dir, f"remap_{digest}.npz")
+            if os.path.exists(path):
+                with np.load(path) as cached:
+                    tables = (cached['map_x'], cached['map_y'])
+                self._remap_cache[key] = tables
+                return tables
+
+        width, height = out_size
+        u, v = np.meshgrid(np.arange(width), np.arange(height))
+        ground = np.stack([origin[0] + u.ravel() * metres_per_pixel,
+                           origin[1] + v.ravel() * metres_per_pixel], axis=1)
+        image = self.to_image(ground).astype(np.float32)
+        tables = (image[:, 0].reshape(height, width), image[:, 1].reshape(height, width))
+
+        if path is not None:
+            os.makedirs(cache_dir, exist_ok=True)
+            np.savez(path, map_x=tables[0], map_y=tables[1])
+        self._remap_cache[key] = tables
+        return tables
+
+    def warp(self, frame, out_size, metres_per_pixel, origin=(0.0, 0.0), cache_dir=None):
+        """Bird's-eye debug view of the frame using cached remap tables."""
+        map_x, map_y = self.remap_tables(out_size, metres_per_pixel, origin, cache_dir)
+        return cv2.remap(frame, map_x, map_y, cv2.INTER_LINEAR)
+
+
+class TrackHistoryBuffer:
+    """
+    Bounded point histories for the currently active track ids.
+
+    Each active track owns one slot of a preallocated (capacity, max_history, 2)
+    ring buffer. Tracks not seen for more than `max_age` frames are evicted and
+    their slots reused, so memory follows the number of simultaneously visible
+    tracks rather than every id ever seen. The slot arrays only grow (by
+    doubling) when more tracks are active at once than the current capacity.
+    """
+
+    def __init__(self, max_history=20, max_age=30, capacity=64):
+        if max_history < 1:
+            raise ValueError("max_history must be at least 1")
+        self.max_history = max_history
+        self.max_age = max_age
+        self.frame = 0
+        self.gaps = np.zeros(0, dtype=np.int64)
+        self._allocate(capacity)
+
+    def _allocate(self, capacity):
+        self.ids = np.full(capacity, -1, dtype=np.int64)
+        self.points = np.zeros((capacity, self.max_history, 2), dtype=np.float32)
+        self.lengths = np.zeros(capacity, dtype=np.int64)
+        self.heads = np.zeros(capacity, dtype=np.int64)  # Next write position per slot
+        self.last_seen = np.zeros(capacity, dtype=np.int64)
+
+    def _grow(self, capacity):
+        old = (self.ids, self.points, self.lengths, self.heads, self.last_seen)
+        n = len(old[0])
+        self._allocate(capacity)
+        for new_arr, old_arr in zip((self.ids, self.points, self.lengths, self.heads, self.last_seen), old):
+            new_arr[:n] = old_arr
+
+    @property
+    def active_count(self):
+        return int(np.count_nonzero(self.ids >= 0))
+
+    def evict(self):
+        """Free the slots of tracks not seen for more than max_age frames."""
+        stale = (self.ids >= 0) & (self.frame - self.last_seen > self.max_age)
+        self.ids[stale] = -1
+        self.lengths[stale] = 0
+        self.heads[stale] = 0
+
+    def lookup(self, track_ids):
+        """Slot of each track id, or -1 for ids without an active slot."""
+        track_ids = np.asarray(track_ids, dtype=np.int64)
+        active = np.flatnonzero(self.ids >= 0)
+        slots = np.full(len(track_ids), -1, dtype=np.int64)
+        if not len(active) or not len(track_ids):
+            return slots
+        order = np.argsort(self.ids[active])
+        sorted_ids = self.ids[active][order]
+        pos = np.minimum(np.searchsorted(sorted_ids, track_ids), len(sorted_ids) - 1)
+        found = sorted_ids[pos] == track_ids
+        slots[found] = active[order[pos[found]]]
+        return slots
+
+    def update(self, track_ids, points):
+        """
+        Record one (x, y) point per track for a new frame.
+
+        Duplicate ids keep their first point. Returns (track_ids, prev, has_prev,
+        current): the unique ids, each track's previous point, whether it had
+        one, and the point just recorded, all aligned. `self.gaps` is set to the
+        number of frames since each of those previous points (aligned too).
+        """
+        self.frame += 1
+        self.evict()
+
+        track_ids = np.asarray(track_ids, dtype=np.int64).reshape(-1)
+        points = np.asarray(points, dtype=np.float32).reshape(-1, 2)
+        track_ids, first = np.unique(track_ids, return_index=True)
+        points = points[first]
+
+        slots = self.lookup(track_ids)
+        new = slots < 0
+        if new.any():
+            free = np.flatnonzero(self.ids < 0)
+            if len(free) < new.sum():
+                capacity = len(self.ids)
+                while capacity - self.active_count < new.sum():
+                    capacity *= 2
+                self._grow(capacity)
+                free = np.flatnonzero(self.ids < 0)
+            slots[new] = free[:new.sum()]
+            self.ids[slots[new]] = track_ids[new]
+            self.lengths[slots[new]] = 0
+            self.heads[slots[new]] = 0
+
+        has_prev = self.lengths[slots] > 0
+        prev = self.points[slots, (self.heads[slots] - 1) % self.max_history]
+        self.gaps = self.frame - self.last_seen[slots]  # A track may skip frames (up to max_age)
+
+        self.points[slots, self.heads[slots]] = points
+        self.heads[slots] = (self.heads[slots] + 1) % self.max_history
+        self.lengths[slots] = np.minimum(self.lengths[slots] + 1, self.max_history)
+        self.last_seen[slots] = self.frame
+        return track_ids, prev, has_prev, points
+
+    def get_history(self, track_id):
+        """Chronological (n, 2) copy of a track's recorded points (empty if unknown)."""
+        slot = self.lookup([track_id])[0]
+        if slot < 0:
+            return np.empty((0, 2), dtype=np.float32)
+        n = self.lengths[slot]
+        idx = (self.heads[slot] - n + np.arange(n)) % self.max_history
+        return self.points[slot, idx]
+
 
 class VirtualLineCounter:
-    def __init__(self, line_y):
+    def __init__(self, line_y, max_history=20, max_age=30):
+        """Count tracks crossing the horizontal line y = line_y; tracks unseen for max_age frames are forgotten."""
         self.line_y = line_y
         self.counts = {'north': 0, 'south': 0}
-        self.track_history = {}
-        self.max_history = 20
+        self.max_history = max_history
+        self.track_history = TrackHistoryBuffer(max_history=max_history, max_age=max_age)
     
     def update(self, tracks):
-        for track in tracks:
-            if len(track) < 5:
-                continue
-            try:
-                x1, y1, x2, y2, track_id = map(int, track[:5])
-                y_center = (y1 + y2) // 2
-                if track_id not in self.track_history:
-                    self.track_history[track_id] = [y_center]
-                    continue
-                prev_y = self.track_history[track_id][-1]
-                self.track_history[track_id].append(y_center)
-                if prev_y <= self.line_y < y_center:
-                    self.counts['south'] += 1
-                elif prev_y >= self.line_y > y_center:
-                    self.counts['north'] += 1
-                if len(self.track_history[track_id]) > self.max_history:
-                    self.track_history[track_id] = self.track_history[track_id][-self.max_history:]
-            except ValueError:
-                continue
+        tracks = np.asarray(tracks)
+        if not tracks.size or tracks.ndim != 2 or tracks.shape[1] < 5:
+            self.track_history.update([], [])  # Still age out tracks on empty frames
+            return
+        try:
+            boxes = tracks[:, :5].astype(np.int64)
+        except ValueError:
+            return
+        y_center = (boxes[:, 1] + boxes[:, 3]) // 2
+        x_center = (boxes[:, 0] + boxes[:, 2]) // 2
+        _, prev, has_prev, current = self.track_history.update(
+            boxes[:, 4], np.stack([x_center, y_center], axis=1))
+
+        prev_y, y = prev[:, 1], current[:, 1]
+        south = has_prev & (prev_y <= self.line_y) & (self.line_y < y)
+        north = has_prev & (prev_y >= self.line_y) & (self.line_y > y)
+        self.counts['south'] += int(np.count_nonzero(south))
+        self.counts['north'] += int(np.count_nonzero(north))
+
+class MultiLineCounter:
+    """
+    Directional crossing counts for any number of counting lines or polylines.
+
+    `lines` maps a name (e.g. an approach or turning movement) to two or more
+    (x, y) points. Every frame, the step each track made since its previous
+    point is intersected with every line segment in one vectorized pass.
+    'forward' counts crossings with positive cross(segment direction, motion):
+    for a line drawn left-to-right that is downward motion in the image.
+    A track crossing the same polyline twice in one step in opposite
+    directions is not counted.
+    """
+
+    def __init__(self, lines, max_history=20, max_age=30):
+        if not lines:
+            raise ValueError("At least one counting line is required")
+        self.line_names = list(lines)
+        starts, ends, seg_offsets = [], [], []
+        for name in self.line_names:
+            pts = np.asarray(lines[name], dtype=np.float64).reshape(-1, 2)
+            if len(pts) < 2:
+                raise ValueError(f"Line {name} needs at least 2 points")
+            seg_offsets.append(len(starts))
+            starts.extend(pts[:-1])
+            ends.extend(pts[1:])
+        self._seg_start = np.array(starts)
+        self._seg_dir = np.array(ends) - self._seg_start
+        self._seg_offsets = np.array(seg_offsets)
+        self._counts = np.zeros((len(self.line_names), 2), dtype=np.int64)  # forward, backward
+        self.track_history = TrackHistoryBuffer(max_history=max_history, max_age=max_age)
+
+    @property
+    def counts(self):
+        return {name: {'forward': int(fwd), 'backward': int(bwd)}
+                for name, (fwd, bwd) in zip(self.line_names, self._counts)}
+
+    def reset(self):
+        self._counts.fill(0)
+
+    def crossings(self, prev, current):
+        """
+        Signed crossings (+1 forward, -1 backward, 0 none) of each p -> q step
+        against each line, as a (steps, lines) int array.
+        """
+        prev = np.asarray(prev, dtype=np.float64).reshape(-1, 1, 2)
+        motion = np.asarray(current, dtype=np.float64).reshape(-1, 1, 2) - prev
+        seg_dir = self._seg_dir[None]
+        to_start = self._seg_start[None] - prev
+
+        denom = motion[..., 0] * seg_dir[..., 1] - motion[..., 1] * seg_dir[..., 0]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            t = (to_start[..., 0] * seg_dir[..., 1] - to_start[..., 1] * seg_dir[..., 0]) / denom
+            u = (to_start[..., 0] * motion[..., 1] - to_start[..., 1] * motion[..., 0]) / denom
+        # Half-open on the track step so a point landing exactly on a line
+        # is counted once, not again when it leaves
+        hit = (denom != 0) & (t > 0) & (t <= 1) & (u >= 0) & (u <= 1)
+        signed = np.where(hit, -np.sign(denom), 0).astype(np.int64)
+        net = np.add.reduceat(signed, self._seg_offsets, axis=1) if signed.shape[0] else \
+            np.zeros((0, len(self.line_names)), dtype=np.int64)
+        return np.sign(net)
+
+    def update(self, tracks):
+        """Update counts from (N, 5+) [x1, y1, x2, y2, track_id, ...] tracks; returns (track_ids, crossings)."""
+        tracks = np.asarray(tracks)
+        if not tracks.size or tracks.ndim != 2 or tracks.shape[1] < 5:
+            self.track_history.update([], [])
+            return np.empty(0, dtype=np.int64), np.zeros((0, len(self.line_names)), dtype=np.int64)
+        boxes = tracks[:, :5].astype(np.int64)
+        centers = np.stack([(boxes[:, 0] + boxes[:, 2]) // 2, (boxes[:, 1] + boxes[:, 3]) // 2], axis=1)
+        track_ids, prev, has_prev, current = self.track_history.update(boxes[:, 4], centers)
+
+        crossed = np.zeros((len(track_ids), len(self.line_names)), dtype=np.int64)
+        if has_prev.any():
+            crossed[has_prev] = self.crossings(prev[has_prev], current[has_prev])
+        self._counts[:, 0] += np.count_nonzero(crossed > 0, axis=0)
+        self._counts[:, 1] += np.count_nonzero(crossed < 0, axis=0)
+        return track_ids, crossed
 
 class TrafficDensityCounter:
-    def __init__(self, roi_points=None):
+    def __init__(self, roi_points=None, homography=None, fps=30.0):
+        """
+        With a GroundHomography, also reports vehicles per lane-metre and
+        per-track ground speeds (m/s, assuming updates arrive at `fps`; a track
+        missing from some frames is divided by the real frame gap).
+        """
         self.roi_points = roi_points
+        self.homography = homography
+        self.fps = fps
+        self.roi_length_m = None
+        self.vehicles_per_metre = 0.0
+        self.speeds = {}  # track_id -> m/s for tracks in the ROI this frame
+        self.ground_history = TrackHistoryBuffer(max_history=2) if homography is not None else None
         self.current_vehicles = set()
-        self.density_history = []
         self.max_history = 100
+        self.density_stats = RollingLaneStats(['roi'], window=self.max_history,
+                                              value_range=(-0.5, 199.5))  # Integer bucket midpoints
     
     def set_roi(self, roi_points):
         self.roi_points = roi_points
+        self.roi_length_m = None
     
     def point_in_roi(self, point):
         if self.roi_points is None:
@@ -62,9 +374,9 @@ class TrafficDensityCounter:
                 continue
         
         current_density = len(self.current_vehicles)
-        self.density_history.append(current_density)
-        if len(self.density_history) > self.max_history:
-            self.density_history = self.density_history[-self.max_history:]
+        self.density_stats.update((current_density,))
+        if self.homography is not None:
+            self._update_metric(tracks, current_density)
         
         density_percentage = 0
         if self.roi_points is not None:
@@ -74,6 +386,25 @@ class TrafficDensityCounter:
             density_percentage = min(100, (occupied_area / roi_area) * 100)
         
         return current_density, density_percentage
+
+    def _update_metric(self, tracks, current_density):
+        """Ground-plane density and speeds for the tracks counted in the ROI."""
+        if self.roi_length_m is None and self.roi_points is not None:
+            _, self.roi_length_m = self.homography.polygon_metrics(self.roi_points)
+        self.vehicles_per_metre = current_density / self.roi_length_m if self.roi_length_m else 0.0
+
+        tracks = np.asarray(tracks)
+        if not self.current_vehicles or tracks.ndim != 2 or tracks.shape[1] < 5:
+            self.ground_history.update([], [])
+            self.speeds = {}
+            return
+        ids = tracks[:, 4].astype(np.int64)
+        in_roi = np.isin(ids, np.fromiter(self.current_vehicles, dtype=np.int64))
+        ground = self.homography.footprints(tracks[in_roi, :4])
+        track_ids, prev, has_prev, current = self.ground_history.update(ids[in_roi], ground)
+        gaps = np.maximum(self.ground_history.gaps, 1)
+        speeds = np.linalg.norm(current - prev, axis=1) * self.fps / gaps
+        self.speeds = dict(zip(track_ids[has_prev].tolist(), speeds[has_prev].tolist()))
     
     def draw_roi(self, frame):
         if self.roi_points is not None:
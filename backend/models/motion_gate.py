@@ -0,0 +1,70 @@
+import cv2
+import numpy as np
+
+class MotionGate:
+    """
+    Cheap change detector that decides whether a frame needs a fresh detection pass.
+
+    Frames are shrunk to a small grayscale thumbnail (into reused buffers) and
+    compared with the thumbnail of the last frame that was sent to the model.
+    The absolute difference is averaged over blocks; if too few blocks changed
+    by more than `pixel_threshold`, the caller can reuse its previous
+    detections. Comparing against the last inferred frame (not the previous
+    frame) means slow drift still adds up and eventually triggers inference,
+    and `max_skip` forces a refresh after that many consecutive skips.
+    """
+
+    def __init__(self, size=(160, 120), block_size=8, pixel_threshold=12.0,
+                 min_changed_fraction=0.01, max_skip=30):
+        width, height = size
+        if width % block_size or height % block_size:
+            raise ValueError("size must be a multiple of block_size")
+        self.size = (width, height)
+        self.pixel_threshold = pixel_threshold
+        self.min_changed_fraction = min_changed_fraction
+        self.max_skip = max_skip
+
+        self._small = np.empty((height, width, 3), dtype=np.uint8)
+        self._gray = np.empty((height, width), dtype=np.uint8)
+        self._diff = np.empty((height, width), dtype=np.uint8)
+        self._blocks = np.empty((height // block_size, width // block_size), dtype=np.uint8)
+        self._reference = None
+
+        self.frames = 0
+        self.skipped = 0
+        self.consecutive_skips = 0
+        self.changed_fraction = 1.0  # Of the last evaluated frame
+
+    @property
+    def skip_ratio(self):
+        return self.skipped / self.frames if self.frames else 0.0
+
+    def reset(self):
+        """Forget the reference so the next frame is always inferred."""
+        self._reference = None
+
+    def should_infer(self, frame):
+        """True if detection should run on this frame, False if the previous result can be reused."""
+        self.frames += 1
+        if frame.ndim == 3:
+            cv2.resize(frame, self.size, dst=self._small, interpolation=cv2.INTER_AREA)
+            cv2.cvtColor(self._small, cv2.COLOR_BGR2GRAY, dst=self._gray)
+        else:
+            cv2.resize(frame, self.size, dst=self._gray, interpolation=cv2.INTER_AREA)
+
+        if self._reference is not None:
+            cv2.absdiff(self._gray, self._reference, dst=self._diff)
+            cv2.resize(self._diff, self._blocks.shape[::-1], dst=self._blocks, interpolation=cv2.INTER_AREA)
+            self.changed_fraction = np.count_nonzero(self._blocks > self.pixel_threshold) / self._blocks.size
+            if self.changed_fraction < self.min_changed_fraction and self.consecutive_skips < self.max_skip:
+                self.skipped += 1
+                self.consecutive_skips += 1
+                return False
+
+        if self._reference is None:
+            self._reference = self._gray.copy()
+            self.changed_fraction = 1.0
+        else:
+            np.copyto(self._reference, self._gray)
+        self.consecutive_skips = 0
+        return True
@@ -0,0 +1,178 @@
+import ast
+import glob
+import hashlib
+import os
+import shutil
+import cv2
+import numpy as np
+import onnxruntime as ort
+from models.detections import NUM_COLUMNS, X1, Y1, X2, Y2, TRACK_ID, CONF, CLS, empty_detections
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(__file__), 'onnx_cache')
+
+
+def weights_hash(weights_path):
+    """Short content hash of a weights file, used as its export cache key."""
+    digest = hashlib.sha256()
+    with open(weights_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()[:16]
+
+
+def letterbox(frame, imgsz, canvas=None, blob=None):
+    """
+    Resize keeping aspect ratio and pad to a square (imgsz, imgsz) input, as
+    ultralytics does. Returns the (1, 3, imgsz, imgsz) float32 RGB blob and
+    the (scale, pad_x, pad_y) needed to map boxes back to the frame. Pass a
+    (imgsz, imgsz, 3) uint8 `canvas` and a `blob` to fill them in place
+    instead of allocating new ones.
+    """
+    h, w = frame.shape[:2]
+    scale = min(imgsz / h, imgsz / w)
+    new_w, new_h = int(round(w * scale)), int(round(h * scale))
+    pad_x, pad_y = (imgsz - new_w) // 2, (imgsz - new_h) // 2
+    if canvas is None:
+        canvas = np.empty((imgsz, imgsz, 3), dtype=np.uint8)
+    if blob is None:
+        blob = np.empty((1, 3, imgsz, imgsz), dtype=np.float32)
+    canvas.fill(114)
+    canvas[pad_y:pad_y + new_h, pad_x:pad_x + new_w] = cv2.resize(frame, (new_w, new_h),
+                                                                  interpolation=cv2.INTER_LINEAR)
+    # BGR HWC uint8 -> RGB CHW float in [0, 1]
+    np.multiply(canvas[:, :, ::-1].transpose(2, 0, 1), np.float32(1 / 255.0), out=blob[0],
+                dtype=np.float32, casting='unsafe')
+    return blob, (scale, pad_x, pad_y)
+
+
+def export_onnx(weights_path, imgsz=640, cache_dir=DEFAULT_CACHE_DIR):
+    """Export a YOLOv8 .pt model to ONNX once; later calls reuse the cached file."""
+    os.makedirs(cache_dir, exist_ok=True)
+    name = os.path.splitext(os.path.basename(weights_path))[0]
+    target = os.path.join(cache_dir, f"{name}-{weights_hash(weights_path)}-{imgsz}.onnx")
+    if not os.path.exists(target):
+        from ultralytics import YOLO  # Only needed to (re)build the cache
+        exported = YOLO(weights_path).export(format='onnx', imgsz=imgsz, opset=12, dynamic=False)
+        shutil.move(exported, target)
+    return target
+
+
+class VideoCalibrationReader:
+    """Feeds letterboxed frames sampled from videos to onnxruntime's static quantizer."""
+
+    def __init__(self, video_paths, input_name, imgsz=640, max_frames=200, every=15):
+        self.video_paths = list(video_paths)
+        self.input_name = input_name
+        self.imgsz = imgsz
+        self.max_frames = max_frames
+        self.every = every
+        self._frames = self._sample()
+
+    def _sample(self):
+        per_video = max(1, self.max_frames // max(1, len(self.video_paths)))
+        for path in self.video_paths:
+            cap = cv2.VideoCapture(path)
+            taken = index = 0
+            try:
+                while taken < per_video:
+                    ret, frame = cap.read()
+                    if not ret:
+                        break
+                    if index % self.every == 0:
+                        taken += 1
+                        yield letterbox(frame, self.imgsz)[0]
+                    index += 1
+            finally:
+                cap.release()
+
+    def get_next(self):
+        blob = next(self._frames, None)
+        return None if blob is None else {self.input_name: blob}
+
+
+def quantize_onnx(model_path, calibration_videos, imgsz=640, max_frames=200):
+    """Static INT8 quantization calibrated on video frames; cached next to the fp32 model."""
+    from onnxruntime.quantization import CalibrationMethod, QuantFormat, QuantType, quantize_static
+    target = model_path.replace('.onnx', '-int8.onnx')
+    if os.path.exists(target):
+        return target
+    videos = sorted(glob.glob(calibration_videos) if isinstance(calibration_videos, str) else calibration_videos)
+    if not videos:
+        raise ValueError(f"No calibration videos found for {calibration_videos!r}")
+    input_name = ort.InferenceSession(model_path, providers=['CPUExecutionProvider']).get_inputs()[0].name
+    reader = VideoCalibrationReader(videos, input_name, imgsz=imgsz, max_frames=max_frames)
+    quantize_static(model_path, target, reader, quant_format=QuantFormat.QDQ,
+                    activation_type=QuantType.QUInt8, weight_type=QuantType.QInt8,
+                    calibrate_method=CalibrationMethod.MinMax)
+    return target
+
+
+class OnnxDetector:
+    """
+    YOLOv8 detector on ONNX Runtime (CPU), without importing torch at run time.
+
+    The .pt weights are exported to ONNX once and cached under `cache_dir`,
+    keyed by a hash of the weights file. With `quantize=True` the export is
+    additionally quantized to INT8, calibrated on frames sampled from
+    `calibration_videos` (a glob or a list of paths). `detect(frame)` returns
+    the same (N, 7) array as models.detections.results_to_array, already
+    filtered by `classes` and `conf` and de-duplicated with class-aware NMS.
+    """
+
+    def __init__(self, weights='yolov8n.pt', imgsz=640, conf=0.3, iou=0.7, classes=None,
+                 quantize=False, calibration_videos='data/*.mp4', cache_dir=DEFAULT_CACHE_DIR,
+                 threads=0):
+        if weights.endswith('.onnx'):
+            model_path = weights
+        else:
+            model_path = export_onnx(weights, imgsz, cache_dir)
+        if quantize:
+            model_path = quantize_onnx(model_path, calibration_videos, imgsz)
+        self.model_path = model_path
+        self.imgsz = imgsz  # Fixed by the export: every frame is letterboxed to this size
+        self.conf = conf
+        self.iou = iou
+        self.classes = None if classes is None else np.asarray(list(classes))
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.intra_op_num_threads = threads  # 0 lets onnxruntime pick
+        self.session = ort.InferenceSession(model_path, options, providers=['CPUExecutionProvider'])
+        self.input_name = self.session.get_inputs()[0].name
+        metadata = self.session.get_modelmeta().custom_metadata_map
+        # ultralytics stores the class names as a dict literal in the model metadata
+        self.names = ast.literal_eval(metadata['names']) if 'names' in metadata else {}
+        # Letterbox buffers, refilled every frame
+        self._canvas = np.empty((imgsz, imgsz, 3), dtype=np.uint8)
+        self._blob = np.empty((1, 3, imgsz, imgsz), dtype=np.float32)
+
+    def detect(self, frame):
+        blob, (scale, pad_x, pad_y) = letterbox(frame, self.imgsz, self._canvas, self._blob)
+        output = self.session.run(None, {self.input_name: blob})[0][0].T  # (anchors, 4 + classes)
+
+        scores = output[:, 4:]
+        cls = scores.argmax(axis=1)
+        conf = scores[np.arange(len(scores)), cls]
+        keep = conf > self.conf
+        if self.classes is not None:
+            keep &= np.isin(cls, self.classes)
+        if not keep.any():
+            return empty_detections()
+        boxes, conf, cls = output[keep, :4], conf[keep], cls[keep]
+
+        # [cx, cy, w, h] -> [x, y, w, h] for NMS, then undo the letterbox
+        xywh = boxes.copy()
+        xywh[:, :2] -= xywh[:, 2:] / 2
+        picked = np.asarray(cv2.dnn.NMSBoxesBatched(xywh.tolist(), conf.tolist(), cls.tolist(),
+                                                    self.conf, self.iou), dtype=np.int64).reshape(-1)
+        detections = np.empty((len(picked), NUM_COLUMNS), dtype=np.float32)
+        xy = xywh[picked, :2]
+        detections[:, X1:Y1 + 1] = xy
+        detections[:, X2:Y2 + 1] = xy + xywh[picked, 2:]
+        detections[:, X1:X2 + 1:2] -= pad_x
+        detections[:, Y1:Y2 + 1:2] -= pad_y
+        detections[:, X1:Y2 + 1] /= scale
+        detections[:, TRACK_ID] = np.arange(len(picked))
+        detections[:, CONF] = conf[picked]
+        detections[:, CLS] = cls[picked]
+        return detections
@@ -0,0 +1,64 @@
+import math
+import cv2
+import numpy as np
+from models.detections import X1, X2, Y1, Y2
+
+class RoiCropper:
+    """
+    Restricts detection to the road: crops frames to the bounding box of the
+    union of lane ROIs and blanks non-road pixels inside it.
+
+    `imgsz` is the smallest stride multiple that holds the crop's long side
+    (capped at `max_imgsz`), so the model letterboxes a smaller input instead
+    of the whole frame. Detections on the crop are shifted back to frame
+    coordinates with `to_frame`.
+    """
+
+    def __init__(self, rois, frame_shape, pad=16, stride=32, max_imgsz=640, mask=True):
+        polys = [np.asarray(roi, dtype=np.int32).reshape(-1, 2) for roi in rois if roi is not None]
+        if not polys:
+            raise ValueError("At least one ROI is required")
+        h, w = frame_shape[:2]
+        pts = np.concatenate(polys)
+        self.x0 = int(max(0, pts[:, 0].min() - pad))
+        self.y0 = int(max(0, pts[:, 1].min() - pad))
+        self.x1 = int(min(w, pts[:, 0].max() + pad))
+        self.y1 = int(min(h, pts[:, 1].max() + pad))
+        if self.x1 <= self.x0 or self.y1 <= self.y0:
+            raise ValueError("ROIs do not overlap the frame")
+
+        crop_h, crop_w = self.y1 - self.y0, self.x1 - self.x0
+        self.imgsz = min(max_imgsz, int(math.ceil(max(crop_h, crop_w) / stride)) * stride)
+        self.frame_shape = (h, w)
+
+        self.mask = None
+        if mask:
+            self.mask = np.zeros((crop_h, crop_w), dtype=np.uint8)
+            cv2.fillPoly(self.mask, [poly - (self.x0, self.y0) for poly in polys], 255)
+            if pad > 0:
+                # Keep vehicles straddling a ROI edge intact
+                self.mask = cv2.dilate(self.mask, np.ones((2 * pad + 1, 2 * pad + 1), dtype=np.uint8))
+        self._crop = np.zeros((crop_h, crop_w, 3), dtype=np.uint8)  # Reused; masked pixels stay black
+
+    @classmethod
+    def from_counter(cls, area_counter, frame_shape, **kwargs):
+        return cls(area_counter.lane_rois.values(), frame_shape, **kwargs)
+
+    @property
+    def area_fraction(self):
+        """Share of the frame area that is sent to the model."""
+        return (self.y1 - self.y0) * (self.x1 - self.x0) / float(self.frame_shape[0] * self.frame_shape[1])
+
+    def crop(self, frame):
+        """Masked crop of the frame (a reused buffer, valid until the next call)."""
+        region = frame[self.y0:self.y1, self.x0:self.x1]
+        if self.mask is None:
+            return region
+        cv2.bitwise_and(region, region, dst=self._crop, mask=self.mask)
+        return self._crop
+
+    def to_frame(self, detections):
+        """Shift (N, 4+) crop detections back into frame coordinates, in place."""
+        detections[:, [X1, X2]] += self.x0
+        detections[:, [Y1, Y2]] += self.y0
+        return detections
@@ -0,0 +1,104 @@
+import numpy as np
+
+class RollingLaneStats:
+    """
+    Constant-memory rolling statistics for a vector of per-lane values.
+
+    Samples live in a preallocated (window, lanes) ring buffer. Every update is
+    O(lanes): the windowed sum and a fixed-bucket histogram are adjusted for
+    the incoming and the evicted sample, and the EWMA is updated in place.
+    `ewma`, `mean` and `latest` are plain ndarrays owned by this object, so
+    readers get them without copying (copy them if you need a snapshot).
+    """
+
+    def __init__(self, lanes, window=100, alpha=0.1, value_range=(0.0, 100.0), bins=200):
+        if window < 1:
+            raise ValueError("window must be at least 1")
+        if not 0 < alpha <= 1:
+            raise ValueError("alpha must be in (0, 1]")
+        self.lanes = list(lanes)
+        self.window = window
+        self.alpha = alpha
+        self.value_range = value_range
+        self.bins = bins
+
+        n = len(self.lanes)
+        self.buffer = np.zeros((window, n), dtype=np.float32)
+        self.ewma = np.zeros(n, dtype=np.float32)
+        self.mean = np.zeros(n, dtype=np.float32)
+        self._sum = np.zeros(n, dtype=np.float64)
+        self._hist = np.zeros((n, bins), dtype=np.int32)
+        self._buffer_bins = np.zeros((window, n), dtype=np.intp)  # Bucket of each buffered sample, for eviction
+        self._lane_idx = np.arange(n)
+        self._bin_width = (value_range[1] - value_range[0]) / bins
+        self.head = 0  # Next write position
+        self.count = 0  # Samples currently in the window
+
+    def reset(self):
+        """Forget all samples."""
+        self.buffer.fill(0)
+        self.ewma.fill(0)
+        self.mean.fill(0)
+        self._sum.fill(0)
+        self._hist.fill(0)
+        self.head = 0
+        self.count = 0
+
+    def update(self, values):
+        """Push one sample per lane (an array in `lanes` order)."""
+        values = np.asarray(values, dtype=np.float32)
+        head = self.head
+
+        if self.count == self.window:
+            self._sum -= self.buffer[head]
+            self._hist[self._lane_idx, self._buffer_bins[head]] -= 1
+        else:
+            self.count += 1
+
+        self.buffer[head] = values
+        bins = ((values - self.value_range[0]) / self._bin_width).astype(np.intp)
+        np.clip(bins, 0, self.bins - 1, out=bins)
+        self._buffer_bins[head] = bins
+        self._hist[self._lane_idx, bins] += 1
+
+        if self.count == 1:
+            self.ewma[:] = values
+        else:
+            self.ewma += self.alpha * (values - self.ewma)
+
+        self.head = (head + 1) % self.window
+        if self.head == 0:
+            # Once per lap, resync the running sum to shed float drift
+            self._sum[:] = self.buffer.sum(axis=0, dtype=np.float64)
+        else:
+            self._sum += values
+        np.divide(self._sum, self.count, out=self.mean, casting='unsafe')
+        return self
+
+    @property
+    def latest(self):
+        """View of the most recent sample."""
+        return self.buffer[(self.head - 1) % self.window]
+
+    def values(self):
+        """Chronological copy of the samples currently in the window."""
+        if self.count < self.window:
+            return self.buffer[:self.count].copy()
+        return np.roll(self.buffer, -self.head, axis=0)
+
+    def percentile(self, q):
+        """Approximate per-lane percentile (0-100), resolved to the histogram bucket midpoint."""
+        if not self.count:
+            return np.zeros(len(self.lanes), dtype=np.float32)
+        cumulative = np.cumsum(self._hist, axis=1)
+        target = max(1, int(np.ceil(q / 100.0 * self.count)))
+        idx = np.argmax(cumulative >= target, axis=1)
+        return (self.value_range[0] + (idx + 0.5) * self._bin_width).astype(np.float32)
+
+    @property
+    def p50(self):
+        return self.percentile(50)
+
+    @property
+    def p95(self):
+        return self.percentile(95)
@@ -0,0 +1,141 @@
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+from models.detections import X1, Y2, TRACK_ID, CLS
+
+# Constant-velocity model on [cx, cy, area, aspect, vcx, vcy, varea] (as in SORT)
+_F = np.eye(7)
+_F[0, 4] = _F[1, 5] = _F[2, 6] = 1.0
+_Q = np.diag([1.0, 1.0, 1.0, 1.0, 0.01, 0.01, 1e-4])
+_R = np.diag([1.0, 1.0, 10.0, 10.0])
+_P0 = np.diag([10.0, 10.0, 10.0, 10.0, 1e4, 1e4, 1e4])  # Unobserved velocities start very uncertain
+
+
+def iou_matrix(boxes_a, boxes_b):
+    """(N, M) IoU between two sets of [x1, y1, x2, y2] boxes, computed in one broadcast."""
+    a = np.asarray(boxes_a, dtype=np.float64)[:, None, :4]
+    b = np.asarray(boxes_b, dtype=np.float64)[None, :, :4]
+    iw = np.clip(np.minimum(a[..., 2], b[..., 2]) - np.maximum(a[..., 0], b[..., 0]), 0, None)
+    ih = np.clip(np.minimum(a[..., 3], b[..., 3]) - np.maximum(a[..., 1], b[..., 1]), 0, None)
+    inter = iw * ih
+    area_a = (a[..., 2] - a[..., 0]) * (a[..., 3] - a[..., 1])
+    area_b = (b[..., 2] - b[..., 0]) * (b[..., 3] - b[..., 1])
+    return inter / np.maximum(area_a + area_b - inter, 1e-9)
+
+
+def _boxes_to_z(boxes):
+    w = boxes[:, 2] - boxes[:, 0]
+    h = boxes[:, 3] - boxes[:, 1]
+    return np.stack([boxes[:, 0] + w / 2, boxes[:, 1] + h / 2, w * h, w / np.maximum(h, 1e-6)], axis=1)
+
+
+def _state_to_boxes(mean):
+    area = np.maximum(mean[:, 2], 1e-6)
+    w = np.sqrt(area * np.maximum(mean[:, 3], 1e-6))
+    h = area / w
+    return np.stack([mean[:, 0] - w / 2, mean[:, 1] - h / 2, mean[:, 0] + w / 2, mean[:, 1] + h / 2], axis=1)
+
+
+class SortTracker:
+    """
+    SORT-style multi-object tracker that gives detections persistent ids.
+
+    Every track's Kalman state lives in one (T, 7) mean array and one
+    (T, 7, 7) covariance array, so prediction and correction are a few
+    batched matrix products no matter how many tracks there are. Detections
+    are matched to predicted boxes by Hungarian assignment on a vectorized
+    IoU cost matrix; pairs below `iou_threshold` stay unmatched. Unmatched
+    detections start new tracks, and tracks unseen for more than `max_age`
+    updates are dropped. Ids wrap around at ID_LIMIT so they stay exact in
+    the float32 TRACK_ID column.
+    """
+
+    ID_LIMIT = 1 << 24  # float32 represents every integer below 2**24 exactly
+
+    def __init__(self, max_age=30, iou_threshold=0.3):
+        self.max_age = max_age
+        self.iou_threshold = iou_threshold
+        self.next_id = 0
+        self.reset()
+
+    def reset(self):
+        self.ids = np.empty(0, dtype=np.int64)
+        self.mean = np.empty((0, 7))
+        self.cov = np.empty((0, 7, 7))
+        self.hits = np.empty(0, dtype=np.int64)
+        self.time_since_update = np.empty(0, dtype=np.int64)
+        self.cls = np.empty(0, dtype=np.float32)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _predict(self):
+        # Keep the predicted area positive
+        shrinking = self.mean[:, 2] + self.mean[:, 6] <= 0
+        self.mean[shrinking, 6] = 0.0
+        self.mean = self.mean @ _F.T
+        self.cov = _F @ self.cov @ _F.T + _Q
+        self.time_since_update += 1
+
+    def _correct(self, idx, z):
+        mean, cov = self.mean[idx], self.cov[idx]
+        # H selects the first four state entries, so H P H^T and P H^T are plain slices
+        S = cov[:, :4, :4] + _R
+        K = np.linalg.solve(S, cov[:, :4, :]).transpose(0, 2, 1)  # (M, 7, 4); S is symmetric
+        innovation = z - mean[:, :4]
+        self.mean[idx] = mean + (K @ innovation[:, :, None])[:, :, 0]
+        self.cov[idx] = cov - K @ cov[:, :4, :]
+        self.hits[idx] += 1
+        self.time_since_update[idx] = 0
+
+    def _spawn(self, z, cls):
+        n = len(z)
+        mean = np.zeros((n, 7))
+        mean[:, :4] = z
+        self.ids = np.concatenate([self.ids, np.arange(self.next_id, self.next_id + n) % self.ID_LIMIT])
+        self.next_id = (self.next_id + n) % self.ID_LIMIT
+        self.mean = np.concatenate([self.mean, mean])
+        self.cov = np.concatenate([self.cov, np.broadcast_to(_P0, (n, 7, 7))])
+        self.hits = np.concatenate([self.hits, np.ones(n, dtype=np.int64)])
+        self.time_since_update = np.concatenate([self.time_since_update, np.zeros(n, dtype=np.int64)])
+        self.cls = np.concatenate([self.cls, cls.astype(np.float32)])
+
+    def predicted_boxes(self):
+        """Current (T, 4) box estimates of all live tracks."""
+        return _state_to_boxes(self.mean)
+
+    def update(self, detections):
+        """
+        Advance all tracks one frame and match them against an (N, 7) detection
+        array (see models.detections). The TRACK_ID column is overwritten with
+        persistent ids in place; the same array is returned.
+        """
+        if len(self.ids):
+            self._predict()
+        n = len(detections)
+        track_of_det = np.full(n, -1, dtype=np.int64)
+
+        if n and len(self.ids):
+            iou = iou_matrix(detections[:, X1:Y2 + 1], self.predicted_boxes())
+            rows, cols = linear_sum_assignment(iou, maximize=True)
+            good = iou[rows, cols] >= self.iou_threshold
+            rows, cols = rows[good], cols[good]
+            if len(rows):
+                self._correct(cols, _boxes_to_z(detections[rows, X1:Y2 + 1].astype(np.float64)))
+                self.cls[cols] = detections[rows, CLS]
+                track_of_det[rows] = cols
+
+        new = track_of_det < 0
+        if new.any():
+            first = len(self.ids)
+            self._spawn(_boxes_to_z(detections[new, X1:Y2 + 1].astype(np.float64)), detections[new, CLS])
+            track_of_det[new] = np.arange(first, len(self.ids))
+
+        if n:
+            detections[:, TRACK_ID] = self.ids[track_of_det]
+
+        alive = self.time_since_update <= self.max_age
+        if not alive.all():
+            self.ids, self.mean, self.cov = self.ids[alive], self.mean[alive], self.cov[alive]
+            self.hits, self.time_since_update = self.hits[alive], self.time_since_update[alive]
+            self.cls = self.cls[alive]
+        return detections
@@ -1,21 +1,28 @@
 from stable_baselines3 import PPO
 
 class TrafficRLAgent:
-    def __init__(self, env):
+    def __init__(self, env, n_steps=1024, batch_size=64, seed=None, verbose=1):
+        # env may be a single TrafficSignalEnv or a VecEnv of copies (see train.py);
+        # each rollout then collects n_steps from every copy
         self.model = PPO(
             "MlpPolicy",
             env,
-            verbose=1,
+            verbose=verbose,
             device="cpu",
-            n_steps=1024,
-            batch_size=64,
+            n_steps=n_steps,
+            batch_size=batch_size,
             learning_rate=3e-4,
-            gamma=0.99
+            gamma=0.99,
+            seed=seed
         )
     
     def predict_action(self, state):
         return self.model.predict(state)[0]
     
+    def learn(self, total_timesteps, callback=None):
+        self.model.learn(total_timesteps=total_timesteps, callback=callback)
+        return self
+
     def save(self, path):
         self.model.save(path)
     
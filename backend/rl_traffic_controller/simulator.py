@@ -0,0 +1,134 @@
+import cv2
+import numpy as np
+
+class TrafficSimulator:
+    # Each generated frame is 1/FPS simulated seconds (vehicles move 5px per frame)
+    FPS = 20
+
+    def __init__(self, seed=None):
+        self.frame_width = 800
+        self.frame_height = 600
+        self.frame_shape = (self.frame_height, self.frame_width)
+        # Own generator so parallel simulators (see rl_traffic_controller.train) don't share a stream
+        self.rng = np.random.default_rng(seed)
+        self.vehicles = []
+        self.next_id = 0
+        self.colors = {
+            "north": (0, 255, 0),
+            "south": (0, 255, 0),
+            "east": (0, 0, 255),
+            "west": (0, 0, 255)
+        }
+        self.traffic_env = None
+
+    def set_traffic_env(self, env):
+        self.traffic_env = env
+
+    def reset(self, seed=None):
+        if seed is not None:
+            self.rng = np.random.default_rng(seed)
+        self.vehicles = []
+        self.next_id = 0
+
+    def step(self):
+        """Advance one frame without drawing; returns the (N, 5) [x1, y1, x2, y2, id] detections."""
+        if self.rng.random() < 0.1:
+            self._add_vehicle()
+
+        self._move_vehicles()
+        return self._detections()
+
+    def _detections(self):
+        if not self.vehicles:
+            return np.empty((0, 5))
+        return np.array([[x, y, x+w, y+h, vid] for x, y, w, h, vid, _ in self.vehicles])
+
+    def generate_frame(self):
+        frame = np.zeros((self.frame_height, self.frame_width, 3), dtype=np.uint8)
+
+        cv2.rectangle(frame, (200, 0), (600, 600), (50, 50, 50), -1)  # Wider NS road
+        cv2.rectangle(frame, (0, 150), (800, 450), (50, 50, 50), -1)  # Wider EW road
+
+        detections = self.step()
+
+        for vehicle in self.vehicles:
+            x, y, w, h, vid, direction = vehicle
+            color = self.colors[direction]
+            cv2.rectangle(frame, (x, y), (x+w, y+h), color, -1)
+
+        return frame, detections
+
+    def _add_vehicle(self):
+        w, h = 40, 20
+        direction = str(self.rng.choice(["north", "south", "east", "west"]))
+
+        if direction == "north":
+            x = int(self.rng.integers(350, 450))
+            y = -h
+        elif direction == "south":
+            x = int(self.rng.integers(350, 450))
+            y = self.frame_height
+        elif direction == "east":
+            x = self.frame_width
+            y = int(self.rng.integers(250, 350))
+        else:
+            x = -w
+            y = int(self.rng.integers(250, 350))
+
+        self.vehicles.append([x, y, w, h, self.next_id, direction])
+        self.next_id += 1
+
+    def _move_vehicles(self):
+        stop_line = {
+            "north": self.frame_height//2 - 20,
+            "south": self.frame_height//2 + 20,
+            "east": self.frame_width//2 - 20,
+            "west": self.frame_width//2 + 20
+        }
+
+        intersection_start = {
+            "north": self.frame_height//2 - 150,
+            "south": self.frame_height//2 + 150,
+            "east": self.frame_width//2 - 150,
+            "west": self.frame_width//2 + 150
+        }
+
+        for i in range(len(self.vehicles) - 1, -1, -1):
+            x, y, w, h, vid, direction = self.vehicles[i]
+
+            current_allowed = self.traffic_env.allowed_directions if self.traffic_env else []
+
+            if direction in current_allowed:
+                current_speed = 5  # Full speed when green
+            else:
+                axis = y if direction in ["north", "south"] else x
+                dist = abs(axis - stop_line[direction])
+                current_speed = min(5, max(0, dist//5))  # Gradual stopping
+
+            # Update position, ensuring vehicles stay in their lanes and don’t enter intersection unless green
+            if direction == "north":
+                if y < intersection_start["north"] or direction in current_allowed:
+                    y += current_speed
+                if y > stop_line["north"] + h and direction not in current_allowed:
+                    y = stop_line["north"] + h  # Stop just past stop line
+            elif direction == "south":
+                if y > intersection_start["south"] or direction in current_allowed:
+                    y -= current_speed
+                if y < stop_line["south"] - h and direction not in current_allowed:
+                    y = stop_line["south"] - h  # Stop just past stop line
+            elif direction == "east":
+                if x > intersection_start["east"] or direction in current_allowed:
+                    x -= current_speed
+                if x < stop_line["east"] + w and direction not in current_allowed:
+                    x = stop_line["east"] + w  # Stop just past stop line
+            else:  # west
+                if x < intersection_start["west"] or direction in current_allowed:
+                    x += current_speed
+                if x > stop_line["west"] - w and direction not in current_allowed:
+                    x = stop_line["west"] - w  # Stop just past stop line
+
+            # Check if vehicle is off-screen (remove if outside bounds with buffer)
+            if x < -100 or x > self.frame_width + 100 or y < -100 or y > self.frame_height + 100:
+                del self.vehicles[i]
+            else:
+                self.vehicles[i] = [x, y, w, h, vid, direction]
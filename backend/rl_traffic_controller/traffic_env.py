@@ -1,13 +1,31 @@
 import gymnasium as gym
 from gymnasium import spaces
 import numpy as np
-import time
+from rl_traffic_controller.utils import RealClock
 
 class TrafficSignalEnv(gym.Env):
-    def __init__(self, density_source, signal_controller):
+    # 'instant' reads density_source.lane_densities; the others read the
+    # matching attribute of density_source.stats (a RollingLaneStats)
+    OBSERVATIONS = ('instant', 'ewma', 'mean', 'p50', 'p95')
+    LIVE_STATS = ('ewma', 'mean')  # Buffers RollingLaneStats owns and mutates
+
+    def __init__(self, density_source, signal_controller, observation='instant', clock=None,
+                 simulator=None, max_steps=None):
         super().__init__()
+        if observation not in self.OBSERVATIONS:
+            raise ValueError(f"Invalid observation: {observation}")
         self.density_source = density_source
         self.signal_controller = signal_controller
+        self.observation = observation
+        # RealClock for live control; a SimClock advances a fixed dt per step (training)
+        self.clock = clock if clock is not None else RealClock()
+        # With a simulator the env steps it (and the density source) itself, headless;
+        # otherwise the caller feeds density_source every frame (live / main.py)
+        self.simulator = simulator
+        if simulator is not None:
+            simulator.set_traffic_env(self)
+        self.max_steps = max_steps  # Episode is truncated after this many steps (None: never)
+        self.step_count = 0
         
         # Define observation space
         self.observation_space = spaces.Box(
@@ -34,7 +52,7 @@ class TrafficSignalEnv(gym.Env):
         
         # Initialize state
         self.current_phase = 0
-        self.phase_start_time = time.time()
+        self.phase_start_time = self.clock.now()
         self.phase_red_times = [0.0, 0.0]  # NS red time, EW red time
 
         # Define phase directions
@@ -49,13 +67,23 @@ class TrafficSignalEnv(gym.Env):
 
     def reset(self, seed=None, options=None):
         super().reset(seed=seed)
+        if self.simulator is not None:
+            self.simulator.reset(seed)
+        self.step_count = 0
         self.current_phase = 0
-        self.phase_start_time = time.time()
+        self.phase_start_time = self.clock.now()
         self.phase_red_times = [0.0, 0.0]
+        self.allowed_directions = self.PHASE_DIRECTIONS[self.current_phase]
         self.density_source.reset()
         return self._get_state(), {}
 
     def _get_state(self):
+        if self.observation != 'instant':
+            # Lanes are kept in north, south, east, west order by the counter. The stats
+            # are already float32, so asarray never converts: p50/p95 are fresh arrays and
+            # are returned as is, only ewma/mean (updated in place next step) are copied
+            state = np.asarray(getattr(self.density_source.stats, self.observation), dtype=np.float32)
+            return state.copy() if self.observation in self.LIVE_STATS else state
         return np.array([
             self.density_source.lane_densities['north'],
             self.density_source.lane_densities['south'],
@@ -64,8 +92,13 @@ class TrafficSignalEnv(gym.Env):
         ], dtype=np.float32)
 
     def step(self, action):
+        if self.simulator is not None:
+            self.density_source.update(self.simulator.step(), self.simulator.frame_shape)
+        self.step_count += 1
+
         # Update phase timers
-        current_time = time.time()
+        self.clock.advance()
+        current_time = self.clock.now()
         time_delta = current_time - self.phase_start_time
         
         # Update red times for non-active phases
@@ -89,7 +122,12 @@ class TrafficSignalEnv(gym.Env):
         
         # Check termination
         done = False
-        return state, reward, done, False, {}
+        truncated = self.max_steps is not None and self.step_count >= self.max_steps
+        info = {
+            'phase': self.current_phase,
+            'density_percentage': self.density_source.density_percentage,
+        }
+        return state, reward, done, truncated, info
 
     def _calculate_reward(self):
         return self.density_source.density_percentage * 0.1  # Simple reward
\ No newline at end of file
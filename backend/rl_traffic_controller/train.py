@@ -0,0 +1,92 @@
+import argparse
+import os
+import numpy as np
+from stable_baselines3.common.monitor import Monitor
+from stable_baselines3.common.vec_env import DummyVecEnv, SubprocVecEnv
+from models.area_counter import AreaVehicleCounter
+from rl_traffic_controller.agent import TrafficRLAgent
+from rl_traffic_controller.signal_controller import TrafficSignalController
+from rl_traffic_controller.simulator import TrafficSimulator
+from rl_traffic_controller.traffic_env import TrafficSignalEnv
+from rl_traffic_controller.utils import SimClock
+
+def make_env(rank, seed=0, max_steps=2000, log_dir=None, observation='instant'):
+    """
+    Factory for one headless training env: its own simulator (seeded seed + rank),
+    counter, controller and SimClock, wrapped in a Monitor that logs episode
+    reward/length (and the last density) to log_dir/env_<rank>.monitor.csv.
+    """
+    def _init():
+        simulator = TrafficSimulator(seed=seed + rank)
+        clock = SimClock(dt=1.0 / TrafficSimulator.FPS)
+        env = TrafficSignalEnv(AreaVehicleCounter(), TrafficSignalController(phases=4, clock=clock),
+                               observation=observation, clock=clock, simulator=simulator,
+                               max_steps=max_steps)
+        filename = os.path.join(log_dir, f"env_{rank}") if log_dir else None
+        env = Monitor(env, filename, info_keywords=('density_percentage',))
+        env.reset(seed=seed + rank)
+        return env
+    return _init
+
+
+def make_vec_env(n_envs, seed=0, subprocess=True, **env_kwargs):
+    """N env copies: one process each with SubprocVecEnv, or all in-process with DummyVecEnv."""
+    env_fns = [make_env(rank, seed, **env_kwargs) for rank in range(n_envs)]
+    if subprocess and n_envs > 1:
+        return SubprocVecEnv(env_fns)
+    return DummyVecEnv(env_fns)
+
+
+def env_metrics(vec_env):
+    """Per-env episode statistics from each copy's Monitor."""
+    metrics = []
+    for rank, (rewards, lengths) in enumerate(zip(vec_env.env_method('get_episode_rewards'),
+                                                  vec_env.env_method('get_episode_lengths'))):
+        metrics.append({
+            'env': rank,
+            'episodes': len(rewards),
+            'mean_reward': float(np.mean(rewards)) if rewards else 0.0,
+            'mean_length': float(np.mean(lengths)) if lengths else 0.0,
+        })
+    return metrics
+
+
+def train(total_timesteps=200_000, n_envs=None, n_steps=1024, batch_size=64, seed=0, max_steps=2000,
+          subprocess=True, log_dir='logs/ppo', save_path='traffic_rl_model.zip'):
+    """
+    Train PPO on n_envs parallel env copies (default: one per core). Each
+    rollout collects n_steps from every copy, i.e. n_steps * n_envs samples.
+    """
+    n_envs = n_envs or os.cpu_count() or 1
+    if log_dir:
+        os.makedirs(log_dir, exist_ok=True)
+    vec_env = make_vec_env(n_envs, seed=seed, subprocess=subprocess, max_steps=max_steps, log_dir=log_dir)
+    try:
+        print(f"Training on {n_envs} envs, {n_steps * n_envs} samples per rollout")
+        agent = TrafficRLAgent(vec_env, n_steps=n_steps, batch_size=batch_size, seed=seed)
+        agent.learn(total_timesteps)
+        agent.save(save_path)
+        for m in env_metrics(vec_env):
+            print(f"env {m['env']}: {m['episodes']} episodes, mean reward {m['mean_reward']:.2f}, "
+                  f"mean length {m['mean_length']:.0f}")
+    finally:
+        vec_env.close()
+    return agent
+
+
+if __name__ == "__main__":
+    # Run from backend/: python -m rl_traffic_controller.train
+    parser = argparse.ArgumentParser(description="Train the traffic signal PPO agent on parallel simulators")
+    parser.add_argument('--timesteps', type=int, default=200_000)
+    parser.add_argument('--n-envs', type=int, default=None, help="env copies (default: one per core)")
+    parser.add_argument('--n-steps', type=int, default=1024, help="rollout steps per env")
+    parser.add_argument('--batch-size', type=int, default=64, help="PPO minibatch size")
+    parser.add_argument('--max-steps', type=int, default=2000, help="episode length in env steps")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--dummy', action='store_true', help="run all envs in this process (DummyVecEnv)")
+    parser.add_argument('--log-dir', default='logs/ppo')
+    parser.add_argument('--save-path', default='traffic_rl_model.zip')
+    args = parser.parse_args()
+    train(total_timesteps=args.timesteps, n_envs=args.n_envs, n_steps=args.n_steps, batch_size=args.batch_size,
+          seed=args.seed, max_steps=args.max_steps, subprocess=not args.dummy, log_dir=args.log_dir,
+          save_path=args.save_path)
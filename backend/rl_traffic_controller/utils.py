@@ -0,0 +1,32 @@
+import time
+
+class RealClock:
+    """Wall-clock time for live deployment; advance() is a no-op because time passes by itself."""
+
+    def now(self):
+        return time.monotonic()
+
+    def advance(self, dt=None):
+        pass
+
+
+class SimClock:
+    """
+    Simulated time that only moves when advanced, by `dt` seconds per step.
+
+    TrafficSignalEnv advances it once per step(), so a 30s phase lasts
+    30 / dt steps however fast the steps run; training is then bounded by
+    compute, not by the wall clock.
+    """
+
+    def __init__(self, dt=0.05, start=0.0):
+        if dt <= 0:
+            raise ValueError("dt must be positive")
+        self.dt = dt
+        self.time = start
+
+    def now(self):
+        return self.time
+
+    def advance(self, dt=None):
+        self.time += self.dt if dt is None else dt
@@ -1,15 +1,10 @@
+import argparse
 import cv2
 import numpy as np
 from ultralytics import YOLO
+from utils.runner import PipelineRunner
 
-# Load YOLOv8 model
-model = YOLO("yolov8n.pt")  # You can use a different YOLOv8 model
-
-# Define the source (video file or webcam)
-source = "backend\data\dayROI.mp4"  # Change to 0 for webcam
-cap = cv2.VideoCapture(source)
-
-roi = None  # Region of Interest (to be set manually)
+roi = None  # Region of Interest (to be set manually, or from --roi when headless)
 
 # Mouse callback function to select ROI
 def select_roi(event, x, y, flags, param):
@@ -19,62 +14,94 @@ def select_roi(event, x, y, flags, param):
     elif event == cv2.EVENT_LBUTTONUP:
         roi.append((x, y))
 
-# Create a window and set mouse callback
-cv2.namedWindow("Frame")
-cv2.setMouseCallback("Frame", select_roi)
-
-while cap.isOpened():
-    ret, frame = cap.read()
-    if not ret:
-        break
-    
-    # Resize frame for faster processing
-    frame = cv2.resize(frame, (640, 480))
-    
-    # Run YOLO inference
-    results = model(frame, stream=True)
-    
-    vehicle_count = 0
-    
-    for result in results:
-        for box in result.boxes.xyxy:
-            x1, y1, x2, y2 = map(int, box)
-            label = result.names[int(result.boxes.cls[0])]
-            
-            # Check if detected object is a vehicle
-            if label in ["car", "bus", "truck", "motorbike"]:
-                vehicle_count += 1
-                cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
-                cv2.putText(frame, label, (x1, y1 - 5), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
-    
-    # Draw the ROI if selected
-    if roi and len(roi) == 2:
-        cv2.rectangle(frame, roi[0], roi[1], (0, 0, 255), 2)
-        
-        # Count vehicles inside ROI
-        x_min, y_min = roi[0]
-        x_max, y_max = roi[1]
-        
-        vehicles_in_roi = 0
+def main(source="data/dayROI.mp4", headless=False, roi_box=None):
+    global roi
+    if roi_box is not None:
+        x_min, y_min, x_max, y_max = roi_box
+        roi = [(x_min, y_min), (x_max, y_max)]
+
+    # Load YOLOv8 model
+    model = YOLO("yolov8n.pt")  # You can use a different YOLOv8 model
+    cap = cv2.VideoCapture(source)
+
+    # Webcams are paced to their own frame rate, files run as fast as possible
+    is_file = isinstance(source, str) and not source.isdigit()
+    runner = PipelineRunner("Frame", headless=headless,
+                            pace_fps=None if is_file else cap.get(cv2.CAP_PROP_FPS))
+    if not headless:
+        # Create the window up front so the mouse callback can be attached
+        cv2.namedWindow("Frame")
+        cv2.setMouseCallback("Frame", select_roi)
+
+    totals = {'frames': 0, 'vehicles': 0, 'in_roi': 0}  # Reported once at exit
+
+    def step():
+        ret, frame = cap.read()
+        if not ret:
+            raise StopIteration
+
+        # Resize frame for faster processing
+        frame = cv2.resize(frame, (640, 480))
+
+        # Run YOLO inference (a list, so the boxes can be walked twice)
+        results = model(frame, verbose=False)
+
+        vehicle_count = 0
+
         for result in results:
             for box in result.boxes.xyxy:
                 x1, y1, x2, y2 = map(int, box)
-                if x_min < x1 < x_max and y_min < y1 < y_max:
-                    vehicles_in_roi += 1
-        
-        # Display vehicle count inside ROI
-        cv2.putText(frame, f"Vehicles in ROI: {vehicles_in_roi}", (x_min, y_min - 10),
-                    cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 255), 2)
-    
-    # Display total vehicle count
-    cv2.putText(frame, f"Total Vehicles: {vehicle_count}", (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 0, 0), 2)
-    
-    # Show the frame
-    cv2.imshow("Frame", frame)
-    
-    # Press 'q' to exit
-    if cv2.waitKey(1) & 0xFF == ord('q'):
-        break
-
-cap.release()
-cv2.destroyAllWindows()
+                label = result.names[int(result.boxes.cls[0])]
+
+                # Check if detected object is a vehicle
+                if label in ["car", "bus", "truck", "motorbike"]:
+                    vehicle_count += 1
+                    cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
+                    cv2.putText(frame, label, (x1, y1 - 5), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
+
+        # Draw the ROI if selected
+        if roi and len(roi) == 2:
+            cv2.rectangle(frame, roi[0], roi[1], (0, 0, 255), 2)
+
+            # Count vehicles inside ROI
+            x_min, y_min = roi[0]
+            x_max, y_max = roi[1]
+
+            vehicles_in_roi = 0
+            for result in results:
+                for box in result.boxes.xyxy:
+                    x1, y1, x2, y2 = map(int, box)
+                    if x_min < x1 < x_max and y_min < y1 < y_max:
+                        vehicles_in_roi += 1
+
+            # Display vehicle count inside ROI
+            cv2.putText(frame, f"Vehicles in ROI: {vehicles_in_roi}", (x_min, y_min - 10),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 255), 2)
+            totals['in_roi'] += vehicles_in_roi
+
+        totals['frames'] += 1
+        totals['vehicles'] += vehicle_count
+
+        # Display total vehicle count
+        cv2.putText(frame, f"Total Vehicles: {vehicle_count}", (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 0, 0), 2)
+        return frame
+
+    try:
+        runner.run(step)
+        print(runner.report())
+        frames = max(totals['frames'], 1)
+        print(f"Vehicles: {totals['vehicles']} over {totals['frames']} frames "
+              f"({totals['vehicles'] / frames:.1f}/frame), in ROI: {totals['in_roi']} "
+              f"({totals['in_roi'] / frames:.1f}/frame)")
+    finally:
+        cap.release()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Count vehicles inside a rectangular ROI")
+    parser.add_argument('--source', default="data/dayROI.mp4", help="video file, or a camera index")
+    parser.add_argument('--headless', action='store_true', help="run without any GUI calls")
+    parser.add_argument('--roi', type=int, nargs=4, metavar=('X1', 'Y1', 'X2', 'Y2'),
+                        help="ROI rectangle (required to count ROI vehicles when headless)")
+    args = parser.parse_args()
+    source = int(args.source) if args.source.isdigit() else args.source
+    main(source=source, headless=args.headless, roi_box=args.roi)
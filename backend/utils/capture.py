@@ -0,0 +1,146 @@
+import threading
+import time
+from collections import deque
+import cv2
+
+class FrameSource:
+    """
+    Reads one cv2.VideoCapture source on its own thread into a bounded queue.
+
+    With drop_oldest=True (live cameras) a full queue discards its oldest
+    frame, so the consumer always gets the freshest one and never stalls the
+    camera. With drop_oldest=False (video files) the reader blocks instead,
+    so no frame is lost.
+    """
+
+    def __init__(self, source, queue_size=2, width=None, height=None, name=None, drop_oldest=True):
+        if queue_size < 1:
+            raise ValueError("queue_size must be at least 1")
+        self.source = source
+        self.name = name if name is not None else str(source)
+        self.drop_oldest = drop_oldest
+        self.cap = cv2.VideoCapture(source)
+        if width is not None:
+            self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, width)
+        if height is not None:
+            self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+        if not self.cap.isOpened():
+            raise RuntimeError(f"Could not open capture source {source!r}")
+
+        self._queue = deque(maxlen=queue_size)
+        self._cond = threading.Condition()
+        self._running = False
+        self._thread = None
+        self.ended = False
+
+        self.frames_read = 0
+        self.frames_dropped = 0
+        self.frames_delivered = 0
+        self.last_latency = 0.0  # Seconds between capture and pickup of the last delivered frame
+        self.avg_latency = 0.0   # EWMA of the above
+
+    @property
+    def fps(self):
+        return self.cap.get(cv2.CAP_PROP_FPS) or 0.0
+
+    def start(self):
+        if self._thread is None:
+            self._running = True
+            self._thread = threading.Thread(target=self._run, name=f"capture-{self.name}", daemon=True)
+            self._thread.start()
+        return self
+
+    def _run(self):
+        try:
+            while self._running:
+                ret, frame = self.cap.read()
+                captured_at = time.monotonic()
+                with self._cond:
+                    if not ret:
+                        self.ended = True
+                        self._cond.notify_all()
+                        return
+                    self.frames_read += 1
+                    if len(self._queue) == self._queue.maxlen:
+                        if self.drop_oldest:
+                            self._queue.popleft()
+                            self.frames_dropped += 1
+                        else:
+                            while self._running and len(self._queue) == self._queue.maxlen:
+                                self._cond.wait()
+                    self._queue.append((frame, captured_at))
+                    self._cond.notify_all()
+        finally:
+            # A stop() that timed out (e.g. a camera stuck in read()) leaves the release to us
+            if not self._running:
+                self.cap.release()
+
+    def read(self, timeout=None):
+        """
+        Next queued frame as (frame, capture_timestamp).
+
+        Returns (None, None) once the source has ended and the queue is
+        drained, or if nothing arrives within `timeout` seconds.
+        """
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._queue or self.ended or not self._running, timeout):
+                return None, None
+            if not self._queue:
+                return None, None
+            frame, captured_at = self._queue.popleft()
+            self._cond.notify_all()  # Wake a reader blocked on a full queue
+
+            self.frames_delivered += 1
+            self.last_latency = time.monotonic() - captured_at
+            self.avg_latency += 0.1 * (self.last_latency - self.avg_latency)
+            return frame, captured_at
+
+    def stats(self):
+        with self._cond:
+            return {
+                'frames_read': self.frames_read,
+                'frames_dropped': self.frames_dropped,
+                'frames_delivered': self.frames_delivered,
+                'queue_depth': len(self._queue),
+                'capture_latency_ms': self.last_latency * 1000,
+                'avg_capture_latency_ms': self.avg_latency * 1000,
+                'ended': self.ended,
+            }
+
+    def stop(self):
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+            if self._thread.is_alive():
+                return  # Still inside cap.read(); the reader releases the capture when it returns
+            self._thread = None
+        self.cap.release()
+
+
+class CaptureManager:
+    """A set of named FrameSources, one reader thread each."""
+
+    def __init__(self):
+        self.sources = {}
+
+    def add(self, name, source, **kwargs):
+        self.sources[name] = FrameSource(source, name=name, **kwargs).start()
+        return self.sources[name]
+
+    def read_all(self, timeout=None):
+        """Freshest frame of every source as {name: (frame, capture_timestamp)}, skipping ones with none."""
+        frames = {}
+        for name, source in self.sources.items():
+            frame, captured_at = source.read(timeout)
+            if frame is not None:
+                frames[name] = (frame, captured_at)
+        return frames
+
+    def stats(self):
+        return {name: source.stats() for name, source in self.sources.items()}
+
+    def stop(self):
+        for source in self.sources.values():
+            source.stop()
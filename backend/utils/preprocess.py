@@ -1 +1,48 @@
-#image preprcoessing and data cleaning
\ No newline at end of file
+#image preprcoessing and data cleaning
+import cv2
+import numpy as np
+
+class FramePreprocessor:
+    """
+    Allocation-free per-frame preprocessing for the detection loop.
+
+    Brightness/contrast is a 256-entry lookup table built once with
+    cv2.convertScaleAbs itself, so `enhance` matches
+    convertScaleAbs(frame, alpha, beta) exactly. Resizing, the LUT and the
+    optional BGR->RGB swap all write into buffers allocated on the first
+    frame of each shape and reused after that. Returned arrays are those
+    buffers: they stay valid only until the next call of the same method, so
+    copy them if they must outlive the frame.
+    """
+
+    def __init__(self, size=None, alpha=1.2, beta=10, rgb=False):
+        self.size = size  # (width, height) of resized frames, None keeps the input size
+        self.rgb = rgb
+        self.lut = cv2.convertScaleAbs(np.arange(256, dtype=np.uint8).reshape(1, 256), alpha=alpha, beta=beta)
+        self._buffers = {}
+
+    def _buffer(self, name, shape):
+        buf = self._buffers.get(name)
+        if buf is None or buf.shape != shape:
+            buf = np.empty(shape, dtype=np.uint8)
+            self._buffers[name] = buf
+        return buf
+
+    def resize(self, frame):
+        """Frame resized to `size` (the frame itself if it already has that size)."""
+        if self.size is None:
+            return frame
+        width, height = self.size
+        if frame.shape[:2] == (height, width):
+            return frame
+        dst = self._buffer('resized', (height, width) + frame.shape[2:])
+        cv2.resize(frame, (width, height), dst=dst)
+        return dst
+
+    def enhance(self, frame):
+        """Brightness/contrast adjusted copy of the frame, in RGB order if `rgb` is set."""
+        dst = self._buffer('enhanced', frame.shape)
+        cv2.LUT(frame, self.lut, dst=dst)
+        if self.rgb and dst.ndim == 3:
+            cv2.cvtColor(dst, cv2.COLOR_BGR2RGB, dst=dst)  # In place, same size and depth
+        return dst
@@ -0,0 +1,176 @@
+import json
+import signal
+import time
+import numpy as np
+
+# Canonical stage names, so reports from different pipelines line up
+STAGES = ('capture', 'preprocess', 'inference', 'postprocess', 'tracking', 'counting', 'control', 'render')
+
+
+class LatencyHistogram:
+    """
+    Fixed-size log-linear (HDR-style) histogram of durations, in microseconds.
+
+    Each power-of-two range is split into `sub_buckets` linear buckets, so any
+    recorded value is known to within 1/sub_buckets of itself (6.25% at the
+    default 16) from 1us up to `max_seconds`, in a few hundred counters.
+    Recording is a couple of integer operations; nothing is allocated.
+    """
+
+    def __init__(self, max_seconds=60.0, sub_buckets=16):
+        if sub_buckets & (sub_buckets - 1):
+            raise ValueError("sub_buckets must be a power of two")
+        self.sub_buckets = sub_buckets
+        self._sub_bits = sub_buckets.bit_length() - 1
+        self.max_us = int(max_seconds * 1e6)
+        self.counts = np.zeros(self._index(self.max_us) + 1, dtype=np.int64)
+        self.reset()
+
+    def reset(self):
+        self.counts[:] = 0
+        self.count = 0
+        self.total_us = 0
+        self.min_us = None
+        self.max_seen_us = 0
+
+    def _index(self, us):
+        if us < self.sub_buckets:
+            return us
+        shift = us.bit_length() - self._sub_bits - 1
+        return (shift + 1) * self.sub_buckets + (us >> shift) - self.sub_buckets
+
+    def _lower_bound(self, index):
+        if index < 2 * self.sub_buckets:
+            return index
+        shift = index // self.sub_buckets - 1
+        return (self.sub_buckets + index % self.sub_buckets) << shift
+
+    def record(self, seconds):
+        us = min(max(int(seconds * 1e6), 0), self.max_us)
+        self.counts[self._index(us)] += 1
+        self.count += 1
+        self.total_us += us
+        if self.min_us is None or us < self.min_us:
+            self.min_us = us
+        if us > self.max_seen_us:
+            self.max_seen_us = us
+
+    def percentile(self, q):
+        """Approximate q-th percentile in milliseconds (bucket midpoint)."""
+        if not self.count:
+            return 0.0
+        rank = max(1, int(np.ceil(q / 100.0 * self.count)))
+        index = int(np.searchsorted(np.cumsum(self.counts), rank))
+        low, high = self._lower_bound(index), self._lower_bound(index + 1)
+        return (low + high) / 2.0 / 1000.0
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'mean_ms': self.total_us / self.count / 1000.0 if self.count else 0.0,
+            'min_ms': (self.min_us or 0) / 1000.0,
+            'max_ms': self.max_seen_us / 1000.0,
+            'p50_ms': self.percentile(50),
+            'p90_ms': self.percentile(90),
+            'p99_ms': self.percentile(99),
+            'total_s': self.total_us / 1e6,
+        }
+
+
+class _Span:
+    __slots__ = ('histogram', 'start')
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.monotonic()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.record(time.monotonic() - self.start)
+        return False
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class StageProfiler:
+    """
+    Per-stage latency spans for the detection pipelines.
+
+    `with profiler.span('inference'):` times a block on the monotonic clock
+    into that stage's LatencyHistogram. A disabled profiler hands out one
+    shared no-op span, so instrumentation can stay in the hot loop. `report()`
+    summarises every stage (with its share of the profiled time) and `dump()`
+    writes it as JSON; `dump_on_signal()` does so whenever the process gets
+    SIGUSR1, for long-running deployments.
+    """
+
+    def __init__(self, enabled=True, max_seconds=60.0):
+        self.enabled = enabled
+        self.max_seconds = max_seconds
+        self.stages = {}
+        self.started = time.monotonic()
+
+    def histogram(self, stage):
+        hist = self.stages.get(stage)
+        if hist is None:
+            hist = self.stages[stage] = LatencyHistogram(self.max_seconds)
+        return hist
+
+    def span(self, stage):
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self.histogram(stage))
+
+    def record(self, stage, seconds):
+        if self.enabled:
+            self.histogram(stage).record(seconds)
+
+    def reset(self):
+        self.stages.clear()
+        self.started = time.monotonic()
+
+    def report(self):
+        stages = {name: hist.to_dict() for name, hist in self.stages.items()}
+        profiled = sum(stage['total_s'] for stage in stages.values())
+        for stage in stages.values():
+            stage['share'] = stage['total_s'] / profiled if profiled else 0.0
+        # Canonical stages first, in pipeline order
+        order = sorted(stages, key=lambda name: (STAGES.index(name) if name in STAGES else len(STAGES), name))
+        return {
+            'wall_s': time.monotonic() - self.started,
+            'stages': {name: stages[name] for name in order},
+        }
+
+    def dump(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.report(), f, indent=2)
+
+    def summary(self):
+        lines = []
+        for name, stage in self.report()['stages'].items():
+            lines.append(f"{name:<12} n={stage['count']:<7} mean={stage['mean_ms']:.2f}ms "
+                         f"p50={stage['p50_ms']:.2f}ms p99={stage['p99_ms']:.2f}ms ({stage['share']:.0%})")
+        return "\n".join(lines)
+
+    def finish(self, path):
+        """Final dump to `path` at exit; returns summary() for the log."""
+        self.dump(path)
+        return self.summary()
+
+    def dump_on_signal(self, path):
+        """Dump to `path` on SIGUSR1 (POSIX only; a no-op elsewhere)."""
+        if hasattr(signal, 'SIGUSR1'):
+            signal.signal(signal.SIGUSR1, lambda signum, frame: self.dump(path))
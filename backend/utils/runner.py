@@ -0,0 +1,62 @@
+import time
+import cv2
+
+class PipelineRunner:
+    """
+    Drives a per-frame step function, with or without a display window.
+
+    `step()` processes one frame and returns the frame to show (or None when
+    there is nothing to show); it raises StopIteration when the source is
+    exhausted. In headless mode no cv2 GUI call is made at all. With
+    `pace_fps` the loop sleeps until each frame's deadline (live sources and
+    simulations); without it the loop runs as fast as the pipeline allows
+    (video files). Processed fps is available afterwards via `report()`.
+    """
+
+    def __init__(self, window_name='DEKHO', headless=False, pace_fps=None, max_seconds=None):
+        self.window_name = window_name
+        self.headless = headless
+        self.pace_fps = pace_fps if pace_fps and pace_fps > 0 else None
+        self.max_seconds = max_seconds
+        self.frames = 0
+        self.elapsed = 0.0
+
+    @property
+    def processed_fps(self):
+        return self.frames / self.elapsed if self.elapsed > 0 else 0.0
+
+    def run(self, step):
+        if not self.headless:
+            cv2.namedWindow(self.window_name, cv2.WINDOW_NORMAL)
+        interval = 1.0 / self.pace_fps if self.pace_fps else 0.0
+        start = time.monotonic()
+        deadline = start
+        try:
+            while self.max_seconds is None or time.monotonic() - start < self.max_seconds:
+                try:
+                    frame = step()
+                except StopIteration:
+                    break
+                self.frames += 1
+
+                if not self.headless:
+                    if frame is not None:
+                        cv2.imshow(self.window_name, frame)
+                    if cv2.waitKey(1) & 0xFF == ord('q'):
+                        break
+
+                if interval:
+                    deadline += interval
+                    delay = deadline - time.monotonic()
+                    if delay > 0:
+                        time.sleep(delay)
+                    elif delay < -interval:
+                        deadline = time.monotonic()  # Fell behind; don't try to catch up in a burst
+        finally:
+            self.elapsed = time.monotonic() - start
+            if not self.headless:
+                cv2.destroyAllWindows()
+        return self
+
+    def report(self):
+        return f"Processed {self.frames} frames in {self.elapsed:.1f}s ({self.processed_fps:.1f} fps)"
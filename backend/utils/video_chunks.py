@@ -0,0 +1,88 @@
+import bisect
+import shutil
+import subprocess
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+from models.tracker import iou_matrix
+
+def keyframe_indices(video_path, fps):
+    """
+    Frame indices of the video's keyframes, read from packet flags with ffprobe
+    (no decoding). Returns None when ffprobe is not installed or fails.
+    """
+    if shutil.which('ffprobe') is None:
+        return None
+    cmd = ['ffprobe', '-v', 'error', '-select_streams', 'v:0', '-show_entries', 'packet=pts_time,flags',
+           '-of', 'csv=p=0', video_path]
+    try:
+        output = subprocess.run(cmd, capture_output=True, text=True, check=True, timeout=300).stdout
+    except (subprocess.SubprocessError, OSError):
+        return None
+    keyframes = set()
+    for line in output.splitlines():
+        pts_time, _, flags = line.partition(',')
+        if 'K' in flags and pts_time not in ('', 'N/A'):
+            keyframes.add(int(round(float(pts_time) * fps)))
+    return sorted(keyframes) or None
+
+
+def plan_chunks(total_frames, n_chunks, keyframes=None, overlap=30):
+    """
+    Split [0, total_frames) into up to `n_chunks` ranges.
+
+    Returns (warm_start, start, end) tuples: a chunk owns frames [start, end)
+    and decodes from warm_start = start - overlap so its tracks are already
+    established when it reaches its own frames. With `keyframes`, start and
+    warm_start are snapped down to the nearest keyframe, so every seek lands
+    on a keyframe.
+    """
+    def snap(frame):
+        frame = max(0, frame)
+        if not keyframes:
+            return frame
+        i = bisect.bisect_right(keyframes, frame)
+        return keyframes[i - 1] if i else 0
+
+    targets = np.linspace(0, total_frames, n_chunks + 1)[1:-1]
+    starts = sorted({0} | {snap(int(t)) for t in targets})
+    bounds = starts + [total_frames]
+    return [(snap(start - overlap) if start else 0, start, end)
+            for start, end in zip(bounds[:-1], bounds[1:]) if end > start]
+
+
+def stitch_tracks(tail, head, min_iou=0.3):
+    """
+    Match tracks of two chunks over the frames both decoded.
+
+    `tail` and `head` map frame index -> (track_ids, boxes) for the earlier
+    chunk's last frames and the later chunk's warm-up frames. The mean IoU of
+    every (tail track, head track) pair, over the shared frames where either
+    of the two is present (so tracks that start or end inside the overlap
+    still match), is assigned optimally; pairs below `min_iou` stay
+    unmatched. Returns {head_track_id: tail_track_id}.
+    """
+    frames = sorted(set(tail) & set(head))
+    if not frames:
+        return {}
+    tail_ids = np.unique(np.concatenate([tail[f][0] for f in frames]))
+    head_ids = np.unique(np.concatenate([head[f][0] for f in frames]))
+    if not len(tail_ids) or not len(head_ids):
+        return {}
+
+    total = np.zeros((len(tail_ids), len(head_ids)))
+    tail_seen = np.zeros(len(tail_ids))
+    head_seen = np.zeros(len(head_ids))
+    both_seen = np.zeros_like(total)
+    for f in frames:
+        (t_ids, t_boxes), (h_ids, h_boxes) = tail[f], head[f]
+        rows = np.searchsorted(tail_ids, t_ids)
+        cols = np.searchsorted(head_ids, h_ids)
+        tail_seen[rows] += 1
+        head_seen[cols] += 1
+        if len(t_ids) and len(h_ids):
+            both_seen[np.ix_(rows, cols)] += 1
+            total[np.ix_(rows, cols)] += iou_matrix(t_boxes, h_boxes)
+    mean_iou = total / (tail_seen[:, None] + head_seen[None, :] - both_seen)
+    rows, cols = linear_sum_assignment(mean_iou, maximize=True)
+    good = mean_iou[rows, cols] >= min_iou
+    return dict(zip(head_ids[cols[good]].tolist(), tail_ids[rows[good]].tolist()))
@@ -0,0 +1,106 @@
+import os
+import queue
+import threading
+import cv2
+
+class AsyncVideoWriter:
+    """
+    Encodes annotated frames on a background thread so recording never stalls the loop.
+
+    `write()` copies the frame into a bounded queue and returns immediately;
+    if the encoder has fallen behind and the queue is full, the frame is
+    dropped and counted in `frames_dropped` instead. With `segment_seconds`
+    the output is rotated into fixed-length files (path-000.mp4,
+    path-001.mp4, ...); otherwise everything goes to `path`. The frame size
+    is taken from the first frame. If encoding fails (bad codec or path) the
+    thread stops and the error is re-raised from the next `write()` and from
+    `close()`, instead of silently dropping everything after it.
+    """
+
+    def __init__(self, path, fps=20.0, segment_seconds=None, queue_size=64, fourcc='mp4v'):
+        self.path = path
+        self.fps = fps if fps and fps > 0 else 20.0
+        self.segment_frames = int(round(segment_seconds * self.fps)) if segment_seconds else None
+        self.fourcc = cv2.VideoWriter_fourcc(*fourcc)
+
+        self.frames_written = 0
+        self.frames_dropped = 0
+        self.segments = []  # Paths of the files written so far
+        self.error = None  # Exception that stopped the encoder thread, if any
+        self._writer = None
+        self._segment_written = 0
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._thread = threading.Thread(target=self._run, name="video-writer", daemon=True)
+        self._thread.start()
+
+    def write(self, frame):
+        """Queue a frame for encoding; returns False if it had to be dropped."""
+        if self.error is not None:
+            raise RuntimeError(f"Video writer stopped: {self.error}") from self.error
+        try:
+            self._queue.put_nowait(frame.copy())  # Callers reuse and redraw their frame buffers
+            return True
+        except queue.Full:
+            self.frames_dropped += 1
+            return False
+
+    def _segment_path(self):
+        if self.segment_frames is None:
+            return self.path
+        root, ext = os.path.splitext(self.path)
+        return f"{root}-{len(self.segments):03d}{ext}"
+
+    def _open_segment(self, frame):
+        path = self._segment_path()
+        h, w = frame.shape[:2]
+        self._writer = cv2.VideoWriter(path, self.fourcc, self.fps, (w, h))
+        if not self._writer.isOpened():
+            raise RuntimeError(f"Could not open video writer for {path}")
+        self.segments.append(path)
+        self._segment_written = 0
+
+    def _run(self):
+        try:
+            while True:
+                frame = self._queue.get()
+                if frame is None:
+                    break
+                if self._writer is None:
+                    self._open_segment(frame)
+                self._writer.write(frame)
+                self.frames_written += 1
+                self._segment_written += 1
+                if self.segment_frames and self._segment_written >= self.segment_frames:
+                    self._writer.release()
+                    self._writer = None
+        except Exception as e:
+            self.error = e
+        finally:
+            if self._writer is not None:
+                self._writer.release()
+                self._writer = None
+
+    def stats(self):
+        return {
+            'frames_written': self.frames_written,
+            'frames_dropped': self.frames_dropped,
+            'segments': list(self.segments),
+        }
+
+    def close(self):
+        """Encode the frames still queued, then close the current file."""
+        while self._thread.is_alive():
+            try:
+                self._queue.put(None, timeout=0.1)  # The thread may have died with the queue full
+                break
+            except queue.Full:
+                continue
+        self._thread.join()
+        if self.error is not None:
+            raise RuntimeError(f"Video writer failed: {self.error}") from self.error
+
+    def close_and_report(self):
+        """close(), then a one-line summary of what was recorded."""
+        self.close()
+        return (f"Recorded {self.frames_written} frames to {', '.join(self.segments)} "
+                f"({self.frames_dropped} dropped)")
@@ -0,0 +1,97 @@
+import cv2
+import numpy as np
+
+LANE_COLORS = {
+    'north': (0, 255, 0),  # Green for North-South
+    'south': (0, 255, 0),  # Green for North-South
+    'east': (0, 0, 255),   # Red for East-West
+    'west': (0, 0, 255)    # Red for East-West
+}
+
+class OverlayRenderer:
+    """
+    Cheap per-frame drawing of an AreaVehicleCounter's overlays.
+
+    Lane ROIs and stop lines are rendered once per frame size (and ROI set)
+    into a sparse pixel list that is stamped onto each frame, and the metrics
+    box darkens only its own rectangle instead of blending a full-frame copy.
+    render_every=N draws every Nth frame; render_every=0 disables drawing.
+    """
+
+    def __init__(self, area_counter, render_every=1, box_alpha=0.7, font_scale=0.8,
+                 line_spacing=30, thickness=2):
+        if render_every < 0:
+            raise ValueError("render_every must be >= 0")
+        self.area_counter = area_counter
+        self.render_every = render_every
+        self.box_alpha = box_alpha
+        self.font = cv2.FONT_HERSHEY_SIMPLEX
+        self.font_scale = font_scale
+        self.line_spacing = line_spacing
+        self.thickness = thickness
+        self.frame_index = 0
+        self._static_key = None
+        self._static_pixels = None
+
+    @property
+    def enabled(self):
+        return self.render_every > 0
+
+    def should_render(self):
+        """Advance the frame counter and report whether this frame gets drawn."""
+        draw = self.enabled and self.frame_index % self.render_every == 0
+        self.frame_index += 1
+        return draw
+
+    def _build_static_layer(self, shape):
+        """Render ROIs and stop lines on a blank canvas and keep only the touched pixels."""
+        h, w = shape[:2]
+        layer = np.zeros((h, w, 3), dtype=np.uint8)
+        for lane, roi in self.area_counter.lane_rois.items():
+            if roi is not None:
+                cv2.polylines(layer, [roi], True, LANE_COLORS.get(lane, (255, 255, 255)), 2)
+
+        # Draw stop lines (yellow) using frame dimensions
+        center_x, center_y = w//2, h//2
+        cv2.line(layer, (center_x-80, center_y-20), (center_x+80, center_y-20), (0, 255, 255), 2)  # North
+        cv2.line(layer, (center_x-80, center_y+20), (center_x+80, center_y+20), (0, 255, 255), 2)  # South
+
+        ys, xs = np.nonzero(layer.any(axis=2))
+        return ys, xs, layer[ys, xs]
+
+    def draw_static(self, frame):
+        """Stamp the cached lane ROI / stop-line layer onto the frame."""
+        key = (frame.shape[:2],) + tuple(
+            roi.tobytes() if roi is not None else None for roi in self.area_counter.lane_rois.values())
+        if key != self._static_key:
+            self._static_pixels = self._build_static_layer(frame.shape)
+            self._static_key = key
+        ys, xs, colors = self._static_pixels
+        frame[ys, xs] = colors
+        return frame
+
+    def draw_metrics(self, frame, lines, origin=(10, 10)):
+        """Draw text lines on a semi-transparent box, blending only the box region."""
+        if not lines:
+            return frame
+        max_width = 0
+        total_height = 0
+        for text in lines:
+            (text_w, text_h), _ = cv2.getTextSize(text, self.font, self.font_scale, self.thickness)
+            max_width = max(max_width, text_w)
+            total_height += max(text_h + 10, self.line_spacing)
+
+        x, y = origin
+        box = frame[y:y + total_height + 10, x:x + max_width + 20]
+        cv2.convertScaleAbs(box, dst=box, alpha=1 - self.box_alpha)
+
+        y_pos = y + self.line_spacing - 10
+        for text in lines:
+            cv2.putText(frame, text, (x + 10, y_pos), self.font, self.font_scale, (255, 255, 255), self.thickness)
+            y_pos += self.line_spacing
+        return frame
+
+    def lane_lines(self):
+        """Lane density lines in the same format as AreaVehicleCounter.draw_visualization."""
+        return [f"{lane.capitalize()}: {density:.1f}%"
+                for lane, density in self.area_counter.lane_densities.items()]